@@ -14,9 +14,11 @@
         "security/ir.model.access.csv",
         "data/ir_cron.xml",
         "views/auditlog_view.xml",
+        "views/auditlog_log_summary_view.xml",
         "views/http_session_view.xml",
         "views/http_request_view.xml",
     ],
+    "uninstall_hook": "uninstall_hook",
     "application": True,
     "installable": True,
 }
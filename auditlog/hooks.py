@@ -0,0 +1,19 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+from psycopg2.extensions import AsIs
+
+from odoo import SUPERUSER_ID, api
+
+from .models.autovacuum import PARTITIONED_TABLE
+
+
+def uninstall_hook(cr, registry):
+    """Drop the database objects Odoo doesn't drop by itself: the partitioned
+    log lines table with its partitions, and the logs summary.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute(
+        "DROP MATERIALIZED VIEW IF EXISTS %s",
+        (AsIs(env["auditlog.log.summary"]._table),),
+    )
+    if env["auditlog.autovacuum"]._is_partitioned(PARTITIONED_TABLE):
+        cr.execute("DROP TABLE %s CASCADE", (AsIs(PARTITIONED_TABLE),))
@@ -59,6 +59,54 @@ class AuditlogLogLineView(models.Model):
             JOIN auditlog_log alog ON alog.id = alogl.log_id
         """
 
+    def _compact_select_query(self):
+        # Changes of compact logs get negative IDs, unique per log and field:
+        # the ID of the log in the high 32 bits, the position of the change
+        # in the low ones
+        return """
+            -((alog.id::bigint << 32) + change.position) AS id,
+            alog.create_date,
+            alog.create_uid,
+            alog.write_uid,
+            alog.write_date,
+            imf.id AS field_id,
+            alog.id AS log_id,
+            change.value->>'old' AS old_value,
+            change.value->>'new' AS new_value,
+            COALESCE(
+                change.value->>'old_text', change.value->>'old'
+            ) AS old_value_text,
+            COALESCE(
+                change.value->>'new_text', change.value->>'new'
+            ) AS new_value_text,
+            change.value->>'field_name' AS field_name,
+            change.value->>'field_description' AS field_description,
+            alog.name,
+            alog.model_id,
+            alog.model_name,
+            alog.model_model,
+            alog.res_id,
+            alog.user_id,
+            alog.method,
+            alog.http_session_id,
+            alog.http_request_id,
+            alog.log_type
+        """
+
+    def _compact_from_query(self):
+        return """
+            auditlog_log alog
+            CROSS JOIN LATERAL jsonb_array_elements(alog.changes)
+                WITH ORDINALITY AS change(value, position)
+            LEFT JOIN ir_model_fields imf
+                ON imf.id = (change.value->>'field_id')::integer
+        """
+
     @property
     def _table_query(self):
-        return "SELECT %s FROM %s" % (self._select_query(), self._from_query())
+        return "SELECT %s FROM %s UNION ALL SELECT %s FROM %s" % (
+            self._select_query(),
+            self._from_query(),
+            self._compact_select_query(),
+            self._compact_from_query(),
+        )
@@ -1,37 +1,301 @@
 # Copyright 2016 ABF OSIELL <https://osiell.com>
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 import logging
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from psycopg2.extensions import AsIs
 
 from odoo import api, fields, models
 
 _logger = logging.getLogger(__name__)
 
+# Tables purged by the autovacuum, in deletion order
+VACUUMED_TABLES = (
+    "auditlog_log_line",
+    "auditlog_log",
+    "auditlog_http_request",
+    "auditlog_http_session",
+)
+# Number of rows deleted per transaction by the autovacuum
+DEFAULT_CHUNK_SIZE = 10000
+# Table partitioned by month of creation, see `partition_log_lines()`
+PARTITIONED_TABLE = "auditlog_log_line"
+# Number of monthly partitions created in advance
+PARTITIONS_AHEAD = 3
+
 
 class AuditlogAutovacuum(models.TransientModel):
     _name = "auditlog.autovacuum"
     _description = "Auditlog - Delete old logs"
 
     @api.model
-    def autovacuum(self, days, chunk_size=None):
+    def autovacuum(self, days, chunk_size=None, time_limit=None):
         """Delete all logs older than ``days``. This includes:
             - CRUD logs (create, read, write, unlink)
             - HTTP requests
             - HTTP user sessions
 
+        Rows are deleted in batches of ``chunk_size`` rows, until there is
+        nothing left to delete or ``time_limit`` seconds are elapsed. Each
+        batch runs and is committed in its own transaction, independently
+        from the transaction of the caller.
+
         Called from a cron.
         """
         days = (days > 0) and int(days) or 0
         deadline = datetime.now() - timedelta(days=days)
-        data_models = ("auditlog.log", "auditlog.http.request", "auditlog.http.session")
-        for data_model in data_models:
-            records = self.env[data_model].search(
-                [("create_date", "<=", fields.Datetime.to_string(deadline))],
-                limit=chunk_size,
-                order="create_date asc",
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        if time_limit:
+            time_limit += time.monotonic()
+        self.env.flush_all()
+        if self._is_partitioned(PARTITIONED_TABLE):
+            # Drop the expired log lines first, the logs deleted below have
+            # nothing to cascade to anymore
+            with self._batch_env() as env:
+                vacuum = self.with_env(env)
+                vacuum._drop_expired_partitions(PARTITIONED_TABLE, deadline)
+                vacuum._create_partitions(PARTITIONED_TABLE)
+        # The log lines are deleted before their logs to keep each batch of
+        # logs from cascading to an unbounded number of lines
+        for table in VACUUMED_TABLES:
+            if not self._vacuum_table(table, deadline, chunk_size, time_limit):
+                break
+        self.env.invalidate_all()
+        return True
+
+    @contextmanager
+    def _batch_env(self):
+        """Return the environment of a batch of the autovacuum, on a new
+        cursor committed at the end of the batch. Tests run in a single
+        transaction, their batches use the current cursor.
+        """
+        if getattr(threading.current_thread(), "testing", False):
+            yield self.env
+            return
+        with self.pool.cursor() as cr:
+            yield self.env(cr=cr)
+
+    @api.model
+    def _vacuum_table(self, table, deadline, chunk_size, time_limit=None):
+        """Delete the rows of `table` created before `deadline`, by batches of
+        `chunk_size` rows, each of them being committed. Returns `False` if
+        `time_limit` was reached before all of them were deleted.
+        """
+        start = time.monotonic()
+        nb_rows = 0
+        done = False
+        while not done:
+            with self._batch_env() as env:
+                env.cr.execute(
+                    """
+                    DELETE FROM %s WHERE id IN (
+                        SELECT id FROM %s
+                        WHERE create_date <= %s
+                        ORDER BY id
+                        LIMIT %s
+                    )
+                    """,
+                    (AsIs(table), AsIs(table), deadline, chunk_size),
+                )
+                nb_rows += env.cr.rowcount
+                done = env.cr.rowcount < chunk_size
+            if not done and time_limit and time.monotonic() >= time_limit:
+                break
+        duration = time.monotonic() - start
+        _logger.info(
+            "AUTOVACUUM - %s '%s' rows deleted in %.1fs (%d rows/s)%s",
+            nb_rows,
+            table,
+            duration,
+            nb_rows / duration if duration else nb_rows,
+            "" if done else ", time limit reached",
+        )
+        return done
+
+    @api.model
+    def partition_log_lines(self):
+        """Turn the log lines table into a table partitioned by month of
+        creation, so that expired log lines can be dropped a whole month at
+        once by the autovacuum. The existing table is kept as the partition
+        of the log lines created until the end of the month of its latest
+        line, and the current month at least.
+
+        The primary key of a partitioned table must include its partition
+        key: the primary key of the log lines becomes (id, create_date). Ids
+        are still unique, all of them being taken from the same sequence.
+        """
+        table = PARTITIONED_TABLE
+        if self._is_partitioned(table):
+            return False
+        legacy_table = "%s_legacy" % table
+        cr = self.env.cr
+        cr.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s",
+            (table,),
+        )
+        indexes = cr.fetchall()
+        cr.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            (table,),
+        )
+        foreign_keys = cr.fetchall()
+        cr.execute("ALTER TABLE %s RENAME TO %s", (AsIs(table), AsIs(legacy_table)))
+        cr.execute(
+            "ALTER TABLE %s RENAME CONSTRAINT %s TO %s",
+            (
+                AsIs(legacy_table),
+                AsIs("%s_pkey" % table),
+                AsIs("%s_pkey" % legacy_table),
+            ),
+        )
+        # The partition key is part of the primary key, it can't be null
+        cr.execute(
+            """
+            UPDATE %s AS alogl
+            SET create_date = COALESCE(alog.create_date, 'epoch')
+            FROM auditlog_log AS alog
+            WHERE alogl.log_id = alog.id AND alogl.create_date IS NULL
+            """,
+            (AsIs(legacy_table),),
+        )
+        cr.execute(
+            """
+            CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS)
+            PARTITION BY RANGE (create_date)
+            """,
+            (AsIs(table), AsIs(legacy_table)),
+        )
+        cr.execute("ALTER TABLE %s ADD PRIMARY KEY (id, create_date)", (AsIs(table),))
+        cr.execute(
+            "ALTER SEQUENCE %s OWNED BY %s.id",
+            (AsIs("%s_id_seq" % table), AsIs(table)),
+        )
+        # Move the indexes and foreign keys of the legacy table to the
+        # partitioned table, the legacy ones get attached to them with the
+        # legacy table
+        for index_name, index_def in indexes:
+            if index_name == "%s_pkey" % table:
+                continue
+            cr.execute(
+                "ALTER INDEX %s RENAME TO %s",
+                (AsIs(index_name), AsIs(index_name.replace(table, legacy_table, 1))),
+            )
+            cr.execute(re.sub(r" ON \S+ ", " ON %s " % table, index_def, 1))
+        for constraint_name, constraint_def in foreign_keys:
+            cr.execute(
+                "ALTER TABLE %s ADD CONSTRAINT %s %s",
+                (AsIs(table), AsIs(constraint_name), AsIs(constraint_def)),
             )
-            nb_records = len(records)
-            with self.env.norecompute():
-                records.unlink()
-            _logger.info("AUTOVACUUM - %s '%s' records deleted", nb_records, data_model)
+        # Attaching the legacy table checks that all its rows are in range
+        cr.execute("SELECT max(create_date) FROM %s", (AsIs(legacy_table),))
+        last_date = (cr.fetchone()[0] or datetime.now()).date()
+        legacy_bound = max(last_date, date.today()).replace(day=1) + relativedelta(
+            months=1
+        )
+        cr.execute(
+            "ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM (MINVALUE) TO (%s)",
+            (AsIs(table), AsIs(legacy_table), legacy_bound),
+        )
+        self._create_partitions(table)
+        # The summary of the logs still reads the legacy table, it is created
+        # again to be filled by its next refresh
+        summary_model = self.env["auditlog.log.summary"]
+        cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s", (AsIs(summary_model._table),))
+        summary_model.init()
+        _logger.info("AUTOVACUUM - table '%s' partitioned by month", table)
         return True
+
+    @api.model
+    def _is_partitioned(self, table):
+        self.env.cr.execute("SELECT relkind FROM pg_class WHERE relname = %s", (table,))
+        row = self.env.cr.fetchone()
+        return bool(row) and row[0] == "p"
+
+    @api.model
+    def _get_partitions(self, table):
+        """Return the partitions of `table` with the upper bound of their
+        range (`None` for the default partition) as a dictionary:
+        {PARTITION_NAME: UPPER_BOUND}
+        """
+        self.env.cr.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            (table,),
+        )
+        partitions = {}
+        for name, bound in self.env.cr.fetchall():
+            upper_bound = re.search(r"TO \('([^']+)'\)", bound)
+            partitions[name] = upper_bound and fields.Datetime.to_datetime(
+                upper_bound.group(1)
+            )
+        return partitions
+
+    @api.model
+    def _create_partitions(self, table):
+        """Create the monthly partitions of `table` up to `PARTITIONS_AHEAD`
+        months after the current one, from the end of the existing ones, and
+        the default partition.
+        """
+        cr = self.env.cr
+        cr.execute(
+            "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s DEFAULT",
+            (AsIs("%s_default" % table), AsIs(table)),
+        )
+        existing_partitions = self._get_partitions(table)
+        month = date.today().replace(day=1)
+        end_month = month + relativedelta(months=PARTITIONS_AHEAD + 1)
+        # The partitions are contiguous from the legacy one, which can hold
+        # the current month
+        upper_bounds = [bound.date() for bound in existing_partitions.values() if bound]
+        if upper_bounds:
+            month = max(month, max(upper_bounds))
+        while month < end_month:
+            next_month = month + relativedelta(months=1)
+            partition = "%s_y%sm%02d" % (table, month.year, month.month)
+            if partition not in existing_partitions:
+                try:
+                    with cr.savepoint():
+                        cr.execute(
+                            """
+                            CREATE TABLE %s PARTITION OF %s
+                            FOR VALUES FROM (%s) TO (%s)
+                            """,
+                            (AsIs(partition), AsIs(table), month, next_month),
+                        )
+                except Exception as e:
+                    # Overlapping range, or rows of this range already stored
+                    # in the default partition
+                    _logger.warning(
+                        "AUTOVACUUM - unable to create partition '%s': %s",
+                        partition,
+                        e,
+                    )
+            month = next_month
+
+    @api.model
+    def _drop_expired_partitions(self, table, deadline):
+        """Drop the partitions of `table` only holding rows older than
+        `deadline`.
+        """
+        for partition, upper_bound in self._get_partitions(table).items():
+            if upper_bound is None or upper_bound > deadline:
+                continue
+            self.env.cr.execute(
+                "ALTER TABLE %s DETACH PARTITION %s", (AsIs(table), AsIs(partition))
+            )
+            self.env.cr.execute("DROP TABLE %s", (AsIs(partition),))
+            _logger.info("AUTOVACUUM - partition '%s' dropped", partition)
@@ -0,0 +1,31 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from psycopg2.extensions import AsIs
+
+from odoo import api, models
+
+
+class AuditlogHTTPLogMixin(models.AbstractModel):
+    _name = "auditlog.http.log.mixin"
+    _description = "Auditlog - HTTP log mixin"
+
+    @api.model
+    def _is_current(self, res_id):
+        """Tell whether the log `res_id` exists in the current transaction.
+        Logs created or found in the transaction are in its cache, which is
+        cleared on rollback (including savepoints), so that the database is
+        only queried once per transaction.
+        """
+        record = self.browse(res_id)
+        field = self._fields["name"]
+        if self.env.cache.contains(record, field):
+            return True
+        # Could have been rolled back after a concurrency error
+        self.env.cr.execute(
+            "SELECT name FROM %s WHERE id = %s", (AsIs(self._table), res_id)
+        )
+        row = self.env.cr.fetchone()
+        if not row:
+            return False
+        self.env.cache.set(record, field, row[0])
+        return True
@@ -7,6 +7,7 @@ from odoo.http import request
 
 class AuditlogtHTTPSession(models.Model):
     _name = "auditlog.http.session"
+    _inherit = "auditlog.http.log.mixin"
     _description = "Auditlog - HTTP User session log"
     _order = "create_date DESC"
 
@@ -42,12 +43,28 @@ class AuditlogtHTTPSession(models.Model):
             return False
         httpsession = request.session
         if httpsession:
+            # Resolved once per HTTP request and user
+            httprequest = request.httprequest
+            uid, session_id = getattr(
+                httprequest, "auditlog_http_session_id", (None, None)
+            )
+            if session_id and uid == request.uid and self._is_current(session_id):
+                return session_id
             existing_session = self.search(
                 [("name", "=", httpsession.sid), ("user_id", "=", request.uid)], limit=1
             )
             if existing_session:
-                return existing_session.id
-            vals = {"name": httpsession.sid, "user_id": request.uid}
-            httpsession.auditlog_http_session_id = self.create(vals).id
-            return httpsession.auditlog_http_session_id
+                session_id = existing_session.id
+            else:
+                vals = {"name": httpsession.sid, "user_id": request.uid}
+                session_id = self.create(vals).id
+                httpsession.auditlog_http_session_id = session_id
+
+                def forget():
+                    vars(httprequest).pop("auditlog_http_session_id", None)
+
+                # The log is gone with the transaction
+                self.env.cr.postrollback.add(forget)
+            httprequest.auditlog_http_session_id = (request.uid, session_id)
+            return session_id
         return False
@@ -0,0 +1,26 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, models
+
+
+class IrModelFields(models.Model):
+    _inherit = "ir.model.fields"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Refresh the fields data cached for auditlog rules."""
+        records = super().create(vals_list)
+        self.env["auditlog.rule"].clear_caches()
+        return records
+
+    def write(self, vals):
+        """Refresh the fields data cached for auditlog rules."""
+        res = super().write(vals)
+        self.env["auditlog.rule"].clear_caches()
+        return res
+
+    def unlink(self):
+        """Refresh the fields data cached for auditlog rules."""
+        res = super().unlink()
+        self.env["auditlog.rule"].clear_caches()
+        return res
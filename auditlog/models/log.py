@@ -1,7 +1,8 @@
 # Copyright 2015 ABF OSIELL <https://osiell.com>
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import UserError
+from odoo.tools.sql import create_index
 
 
 class AuditlogLog(models.Model):
@@ -16,9 +17,18 @@ class AuditlogLog(models.Model):
     model_name = fields.Char(readonly=True)
     model_model = fields.Char(string="Technical Model Name", readonly=True)
     res_id = fields.Integer("Resource ID")
-    user_id = fields.Many2one("res.users", string="User")
+    # Records and fields of the aggregated read logs
+    res_ids = fields.Json("Resource IDs", readonly=True)
+    res_ids_text = fields.Char("Resource IDs (text)", compute="_compute_res_ids_text")
+    read_field_names = fields.Char("Fields Read", readonly=True)
+    user_id = fields.Many2one("res.users", string="User", index=True)
     method = fields.Char(size=64)
     line_ids = fields.One2many("auditlog.log.line", "log_id", string="Fields updated")
+    # Log lines of the rules storing them in the log itself, as a JSON list
+    changes = fields.Json(readonly=True)
+    line_view_ids = fields.One2many(
+        "auditlog.log.line.view", "log_id", string="Fields updated (all)"
+    )
     http_session_id = fields.Many2one(
         "auditlog.http.session", string="Session", index=True
     )
@@ -26,16 +36,41 @@ class AuditlogLog(models.Model):
         "auditlog.http.request", string="HTTP Request", index=True
     )
     log_type = fields.Selection(
-        [("full", "Full log"), ("fast", "Fast log")], string="Type"
+        [("full", "Full log"), ("smart", "Smart full log"), ("fast", "Fast log")],
+        string="Type",
     )
 
+    def init(self):
+        # Logs of a record, as filtered by the 'View logs' actions of the rules
+        create_index(
+            self.env.cr,
+            "auditlog_log_model_id_res_id_create_date_index",
+            self._table,
+            ["model_id", "res_id", "create_date"],
+        )
+        create_index(
+            self.env.cr,
+            "auditlog_log_create_date_index",
+            self._table,
+            ["create_date"],
+        )
+
+    @api.depends("res_ids")
+    def _compute_res_ids_text(self):
+        for log in self:
+            log.res_ids_text = ", ".join(str(res_id) for res_id in log.res_ids or [])
+
     @api.model_create_multi
     def create(self, vals_list):
         """Insert model_name and model_model field values upon creation."""
         for vals in vals_list:
             if not vals.get("model_id"):
                 raise UserError(_("No model defined to create log."))
-            model = self.env["ir.model"].sudo().browse(vals["model_id"])
+        # Browse all the models at once to fetch their data in one query
+        ir_models = (
+            self.env["ir.model"].sudo().browse([vals["model_id"] for vals in vals_list])
+        )
+        for vals, model in zip(vals_list, ir_models):
             vals.update({"model_name": model.name, "model_model": model.model})
         return super().create(vals_list)
 
@@ -67,6 +102,20 @@ class AuditlogLogLine(models.Model):
     field_name = fields.Char("Technical name", readonly=True)
     field_description = fields.Char("Description", readonly=True)
 
+    def _auto_init(self):
+        if not self.env["auditlog.autovacuum"]._is_partitioned(self._table):
+            return super()._auto_init()
+        # Odoo 16 only finds regular tables and views: it would create the
+        # partitioned table (see auditlog.autovacuum) again
+        table_exists = tools.table_exists
+        tools.table_exists = lambda cr, tablename: (
+            tablename == self._table or table_exists(cr, tablename)
+        )
+        try:
+            return super()._auto_init()
+        finally:
+            tools.table_exists = table_exists
+
     @api.model_create_multi
     def create(self, vals_list):
         """Ensure field_id is not empty on creation and store field_name and
@@ -74,7 +123,13 @@ class AuditlogLogLine(models.Model):
         for vals in vals_list:
             if not vals.get("field_id"):
                 raise UserError(_("No field defined to create line."))
-            field = self.env["ir.model.fields"].sudo().browse(vals["field_id"])
+        # Browse all the fields at once to fetch their data in one query
+        fields_ = (
+            self.env["ir.model.fields"]
+            .sudo()
+            .browse([vals["field_id"] for vals in vals_list])
+        )
+        for vals, field in zip(vals_list, fields_):
             vals.update(
                 {"field_name": field.name, "field_description": field.field_description}
             )
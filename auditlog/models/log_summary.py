@@ -0,0 +1,138 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import hashlib
+import logging
+
+from psycopg2.extensions import AsIs
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class AuditlogLogSummary(models.Model):
+    _name = "auditlog.log.summary"
+    _description = "Auditlog - Summary of the logs per model, user and day"
+    _auto = False
+    _order = "date desc, model_id, user_id, method"
+
+    model_id = fields.Many2one("ir.model", readonly=True)
+    user_id = fields.Many2one("res.users", readonly=True)
+    date = fields.Date(readonly=True)
+    method = fields.Char(readonly=True)
+    log_count = fields.Integer("Logs", readonly=True, group_operator="sum")
+    change_count = fields.Integer("Fields Updated", readonly=True, group_operator="sum")
+
+    def _summary_query(self):
+        return """
+            SELECT
+                min(alog.id) AS id,
+                alog.model_id,
+                alog.user_id,
+                alog.create_date::date AS date,
+                alog.method,
+                count(*) AS log_count,
+                sum(
+                    COALESCE(lines.line_count, 0)
+                    + CASE WHEN jsonb_typeof(alog.changes) = 'array'
+                        THEN jsonb_array_length(alog.changes)
+                        ELSE 0
+                    END
+                ) AS change_count
+            FROM auditlog_log alog
+            LEFT JOIN (
+                SELECT log_id, count(*) AS line_count
+                FROM auditlog_log_line
+                GROUP BY log_id
+            ) lines ON lines.log_id = alog.id
+            GROUP BY alog.model_id, alog.user_id, date, alog.method
+        """
+
+    def init(self):
+        # The summary is a materialized view, filled by the refresh cron. It
+        # is created again, empty, when its query changes: the hash of the
+        # query is kept as the comment of the view.
+        query = self._summary_query()
+        query_hash = hashlib.sha256(query.encode()).hexdigest()
+        self.env.cr.execute(
+            "SELECT obj_description(to_regclass(%s), 'pg_class')", (self._table,)
+        )
+        if self.env.cr.fetchone()[0] == query_hash:
+            return
+        table = AsIs(self._table)
+        self.env.cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s", (table,))
+        self.env.cr.execute(
+            "CREATE MATERIALIZED VIEW %s AS %s WITH NO DATA", (table, AsIs(query))
+        )
+        # Allow concurrent refreshes, the id of a row being the first log of
+        # its group
+        self.env.cr.execute(
+            "CREATE UNIQUE INDEX %s ON %s (id)",
+            (AsIs("%s_id_index" % self._table), table),
+        )
+        self.env.cr.execute(
+            "COMMENT ON MATERIALIZED VIEW %s IS %s", (table, query_hash)
+        )
+
+    def _is_populated(self):
+        self.env.cr.execute(
+            "SELECT relispopulated FROM pg_class WHERE oid = %s::regclass",
+            (self._table,),
+        )
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _search(
+        self,
+        domain,
+        offset=0,
+        limit=None,
+        order=None,
+        count=False,
+        access_rights_uid=None,
+    ):
+        # An empty view can't be read until its first refresh
+        if not self._is_populated():
+            return 0 if count else []
+        return super()._search(
+            domain,
+            offset=offset,
+            limit=limit,
+            order=order,
+            count=count,
+            access_rights_uid=access_rights_uid,
+        )
+
+    @api.model
+    def read_group(
+        self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True
+    ):
+        if not self._is_populated():
+            return []
+        return super().read_group(
+            domain,
+            fields,
+            groupby,
+            offset=offset,
+            limit=limit,
+            orderby=orderby,
+            lazy=lazy,
+        )
+
+    @api.model
+    def refresh(self):
+        """Refresh the summary without blocking its readers, once it was
+        filled a first time.
+
+        Called from a cron.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(
+            "REFRESH MATERIALIZED VIEW %s %s",
+            (
+                AsIs("CONCURRENTLY" if self._is_populated() else ""),
+                AsIs(self._table),
+            ),
+        )
+        self.env.invalidate_all()
+        _logger.info("AUDITLOG - logs summary refreshed")
+        return True
@@ -2,9 +2,25 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
 import copy
+import difflib
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+import warnings
+from collections import OrderedDict, defaultdict, namedtuple
 
 from odoo import _, api, fields, models, modules
 from odoo.exceptions import UserError
+from odoo.tools import ormcache
+
+from .. import stats
+from ..sinks import SINKS, get_sink
+from ..writer import get_writer
+
+_logger = logging.getLogger(__name__)
 
 FIELDS_BLACKLIST = [
     "id",
@@ -18,6 +34,50 @@ FIELDS_BLACKLIST = [
 # Used for performance, to avoid a dictionary instanciation when we need an
 # empty dict to simplify algorithms
 EMPTY_DICT = {}
+# Key of the buffer of deferred logs in the cursor callbacks data
+DEFERRED_LOGS_KEY = "auditlog.deferred_logs"
+# Key of the buffer of aggregated reads in the cursor callbacks data
+AGGREGATED_READS_KEY = "auditlog.aggregated_reads"
+# Number of reads (of a record by a user) remembered to skip their
+# repetitions, see `_sample_reads()`
+READ_CACHE_SIZE = 10000
+
+# Types of the fields whose large values can be logged as a digest, and the
+# number of characters of texts kept in their digest
+SUMMARIZED_FIELD_TYPES = ("binary", "html", "text")
+DIGEST_PREFIX_SIZE = 80
+
+_read_cache = OrderedDict()
+_read_cache_lock = threading.Lock()
+_read_counters = defaultdict(itertools.count)
+
+# Key of the buffer of audit events in the cursor callbacks data
+SINK_EVENTS_KEY = "auditlog.sink_events"
+
+# Rule settings read on each logged operation, see `_get_compiled_rule()`
+CompiledRule = namedtuple(
+    "CompiledRule",
+    [
+        "rule_id",
+        "model_id",
+        "log_type",
+        "logging_mode",
+        "capture_record",
+        "compact_storage",
+        "read_mode",
+        "read_sample_rate",
+        "read_dedup_window",
+        "value_size_limit",
+        "log_text_diff",
+        "sink",
+        "fields_to_exclude",
+        "users_to_exclude",
+        "fields",
+    ],
+)
+
+# Stand-in for the logs of the audit events sent to sinks
+EventLog = namedtuple("EventLog", ["id", "res_id", "method", "log_type", "model_id"])
 
 
 class DictDiffer(object):
@@ -79,6 +139,35 @@ class AuditlogRule(models.Model):
         ),
         states={"subscribed": [("readonly", True)]},
     )
+    read_mode = fields.Selection(
+        [("detailed", "One log per record"), ("aggregated", "One log per request")],
+        string="Read Logging",
+        required=True,
+        default="detailed",
+        help=(
+            "One log per record: each record read gets its own log, with the "
+            "values read\n"
+            "One log per request: the reads of a user on the model during a "
+            "transaction are gathered in a single log, storing the ids of the "
+            "records and the names of the fields read"
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
+    read_sample_rate = fields.Integer(
+        "Read Sampling",
+        default=1,
+        help="Log only one read operation out of this number (1 to log them all)",
+        states={"subscribed": [("readonly", True)]},
+    )
+    read_dedup_window = fields.Integer(
+        "Read Deduplication (seconds)",
+        help=(
+            "Log only the first read of a record by a user within this number "
+            "of seconds (0 to log them all). Reads are remembered by each "
+            "server process."
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
     log_write = fields.Boolean(
         "Log Writes",
         default=True,
@@ -107,7 +196,7 @@ class AuditlogRule(models.Model):
         states={"subscribed": [("readonly", True)]},
     )
     log_type = fields.Selection(
-        [("full", "Full log"), ("fast", "Fast log")],
+        [("full", "Full log"), ("smart", "Smart full log"), ("fast", "Fast log")],
         string="Type",
         required=True,
         default="full",
@@ -115,11 +204,33 @@ class AuditlogRule(models.Model):
             "Full log: make a diff between the data before and after "
             "the operation (log more info like computed fields which were "
             "updated, but it is slower)\n"
+            "Smart full log: like the full log, but the diff of a write "
+            "operation is restricted to the written fields and the stored "
+            "computed fields depending on them (faster on models with "
+            "many fields)\n"
             "Fast log: only log the changes made through the create and "
             "write operations (less information, but it is faster)"
         ),
         states={"subscribed": [("readonly", True)]},
     )
+    logging_mode = fields.Selection(
+        [
+            ("sync", "Synchronous"),
+            ("precommit", "Deferred to the end of the transaction"),
+            ("async", "Deferred to a background writer"),
+        ],
+        required=True,
+        default="sync",
+        help=(
+            "Synchronous: logs are written during the logged operation\n"
+            "Deferred to the end of the transaction: logs are kept in memory "
+            "and written all at once just before the transaction is committed\n"
+            "Deferred to a background writer: logs are kept in memory and "
+            "written by a background thread once the transaction is committed "
+            "(logs of a killed server process can be lost)"
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
 
     state = fields.Selection(
         [("draft", "Draft"), ("subscribed", "Subscribed")],
@@ -134,6 +245,43 @@ class AuditlogRule(models.Model):
     capture_record = fields.Boolean(
         help="Select this if you want to keep track of Unlink Record",
     )
+    compact_storage = fields.Boolean(
+        help=(
+            "Select this to store all the changes of a log in the log itself "
+            "instead of one log line per field, text values being kept only "
+            "when they differ from the raw values. The changes are shown "
+            "like log lines in the logs and in the 'Log Lines' menu."
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
+    value_size_limit = fields.Integer(
+        help=(
+            "Values of binary, text and HTML fields larger than this number of "
+            "bytes are logged as a digest: their size, their hash and the "
+            "beginning of texts (0 to log them in full)"
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
+    log_text_diff = fields.Boolean(
+        "Log Text Diffs",
+        help=(
+            "Select this to log the differences between the old and new "
+            "values of the text and HTML fields logged as a digest"
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
+    sink = fields.Selection(
+        selection="_get_sink_selection",
+        required=True,
+        default="database",
+        help=(
+            "Where the logs are stored: in the database, or sent as JSON events "
+            "to a sink configured in the server configuration file, once the "
+            "transaction is committed (the logs are then not available in the "
+            "database)"
+        ),
+        states={"subscribed": [("readonly", True)]},
+    )
     users_to_exclude_ids = fields.Many2many(
         "res.users",
         string="Users to Exclude",
@@ -159,11 +307,15 @@ class AuditlogRule(models.Model):
         )
     ]
 
+    @api.model
+    def _get_sink_selection(self):
+        return [("database", _("Database"))] + [
+            (name, label) for name, (label, __) in SINKS.items()
+        ]
+
     def _register_hook(self):
         """Get all rules and apply them to log method calls."""
         super(AuditlogRule, self)._register_hook()
-        if not hasattr(self.pool, "_auditlog_field_cache"):
-            self.pool._auditlog_field_cache = {}
         if not hasattr(self.pool, "_auditlog_model_cache"):
             self.pool._auditlog_model_cache = {}
         if not self:
@@ -232,6 +384,7 @@ class AuditlogRule(models.Model):
             model = self.env["ir.model"].sudo().browse(vals["model_id"])
             vals.update({"model_name": model.name, "model_model": model.model})
         new_records = super().create(vals_list)
+        self.clear_caches()
         updated = [record._register_hook() for record in new_records]
         if any(updated):
             modules.registry.Registry(self.env.cr.dbname).signal_changes()
@@ -245,6 +398,8 @@ class AuditlogRule(models.Model):
             model = self.env["ir.model"].sudo().browse(vals["model_id"])
             vals.update({"model_name": model.name, "model_model": model.model})
         res = super().write(vals)
+        # Other workers are notified through the registry cache signaling
+        self.clear_caches()
         if self._register_hook():
             modules.registry.Registry(self.env.cr.dbname).signal_changes()
         return res
@@ -254,6 +409,130 @@ class AuditlogRule(models.Model):
         self.unsubscribe()
         return super(AuditlogRule, self).unlink()
 
+    @api.model
+    @ormcache("model_name")
+    def _get_compiled_rule(self, model_name):
+        """Return the subscribed rule of the model `model_name` compiled into
+        an immutable `CompiledRule`, or `None` if the model is not audited.
+        The result is cached by the registry, the cache being cleared when
+        rules are updated.
+        """
+        rule = self.sudo().search(
+            [("model_id.model", "=", model_name), ("state", "=", "subscribed")],
+            limit=1,
+        )
+        if not rule:
+            return None
+        return CompiledRule(
+            rule_id=rule.id,
+            model_id=rule.model_id.id,
+            log_type=rule.log_type,
+            logging_mode=rule.logging_mode,
+            capture_record=rule.capture_record,
+            compact_storage=rule.compact_storage,
+            read_mode=rule.read_mode,
+            read_sample_rate=rule.read_sample_rate,
+            read_dedup_window=rule.read_dedup_window,
+            value_size_limit=rule.value_size_limit,
+            log_text_diff=rule.log_text_diff,
+            sink=rule.sink,
+            fields_to_exclude=frozenset(
+                rule.fields_to_exclude_ids.mapped("name") + FIELDS_BLACKLIST
+            ),
+            users_to_exclude=frozenset(rule.users_to_exclude_ids.ids),
+            fields=tuple(self.get_auditlog_fields(self.env[model_name])),
+        )
+
+    @api.model
+    def _get_write_fields(self, model, vals, fields_list):
+        """Return the fields among `fields_list` which can be updated by the
+        write of `vals` on `model`: the written fields and the computed
+        fields depending on them on the same records.
+        """
+        field_triggers = self.pool.field_triggers
+        todo = [model._fields[fname] for fname in vals if fname in model._fields]
+        done = set()
+        while todo:
+            field = todo.pop()
+            if field in done:
+                continue
+            done.add(field)
+            # Fields to recompute on the same records are under the 'None' key
+            todo.extend(field_triggers.get(field, EMPTY_DICT).get(None, ()))
+        field_names = {field.name for field in done if field.model_name == model._name}
+        return [fname for fname in fields_list if fname in field_names]
+
+    @api.model
+    def _get_fast_values(self, model, vals, fields_list):
+        """Return a snapshot of the values `vals` given to a `create()` of
+        `model`, restricted to the fields of `fields_list`. Binary values are
+        replaced by their size and hash, and *2many commands by a summary, so
+        that large payloads are neither copied nor logged.
+        """
+        snapshot = {}
+        for field_name, value in vals.items():
+            if field_name not in fields_list:
+                continue
+            field = model._fields[field_name]
+            if field.type == "binary" and value:
+                value = self._get_value_digest(value)
+            elif field.type in ("one2many", "many2many") and value:
+                value = self._get_x2many_commands_summary(value)
+            elif isinstance(value, (dict, list)):
+                # Mutable values of JSON-like fields
+                value = copy.deepcopy(value)
+            snapshot[field_name] = value
+        return snapshot
+
+    @api.model
+    def _is_large_value(self, value, size_limit):
+        """Return whether the text or binary `value` is larger than
+        `size_limit` bytes, texts being measured once encoded in UTF-8.
+        """
+        if isinstance(value, bytes):
+            return len(value) > size_limit
+        if not isinstance(value, str):
+            return False
+        # An UTF-8 character takes from 1 to 4 bytes, only texts in between
+        # are encoded
+        if len(value) > size_limit:
+            return True
+        return len(value) * 4 > size_limit and len(value.encode()) > size_limit
+
+    @api.model
+    def _get_value_digest(self, value, ttype="binary"):
+        """Return the digest logged instead of the large `value` of a field of
+        type `ttype`: its size, its sha256 hash and the beginning of texts.
+        """
+        data = value.encode() if isinstance(value, str) else value
+        digest = "<%s: %s bytes, sha256 %s>" % (
+            ttype,
+            len(data),
+            hashlib.sha256(data).hexdigest(),
+        )
+        if ttype != "binary":
+            digest = "%s %s" % (digest, value[:DIGEST_PREFIX_SIZE])
+        return digest
+
+    @api.model
+    def _get_x2many_commands_summary(self, commands):
+        """Return the summary of *2many `commands` logged instead of their
+        values: the values of the created and updated records are replaced by
+        the list of their fields, e.g. [(0, 0, ['name']), (4, 42)].
+        """
+        summary = []
+        for command in commands:
+            if not isinstance(command, (list, tuple)):
+                # List of ids
+                summary.append(command)
+            elif command[0] in (0, 1):
+                summary.append((command[0], command[1], sorted(command[2] or ())))
+            elif command[0] == 6:
+                summary.append((6, 0, list(command[2])))
+            else:
+                summary.append(tuple(command))
+        return summary
+
     @api.model
     def get_auditlog_fields(self, model):
         """
@@ -271,7 +550,6 @@ class AuditlogRule(models.Model):
         """Instanciate a create method that log its calls."""
         self.ensure_one()
         log_type = self.log_type
-        users_to_exclude = self.mapped("users_to_exclude_ids")
 
         @api.model_create_multi
         @api.returns("self", lambda value: value.id)
@@ -279,31 +557,31 @@ class AuditlogRule(models.Model):
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
             new_records = create_full.origin(self, vals_list, **kwargs)
-            # Take a snapshot of record values from the cache instead of using
-            # 'read()'. It avoids issues with related/computed fields which
-            # stored in the database only at the end of the transaction, but
-            # their values exist in cache.
-            new_values = {}
-            fields_list = rule_model.get_auditlog_fields(self)
-            for new_record in new_records.sudo():
-                new_values.setdefault(new_record.id, {})
-                for fname, field in new_record._fields.items():
-                    if fname not in fields_list:
-                        continue
-                    new_values[new_record.id][fname] = field.convert_to_read(
-                        new_record[fname], new_record
-                    )
-            if self.env.user in users_to_exclude:
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
                 return new_records
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                new_records.ids,
-                "create",
-                None,
-                new_values,
-                {"log_type": log_type},
-            )
+            with stats.Measure(self.env.cr, self._name, "create", len(new_records)):
+                # Take a snapshot of record values from the cache instead of
+                # using 'read()'. It avoids issues with related/computed fields
+                # which stored in the database only at the end of the
+                # transaction, but their values exist in cache.
+                new_values = {}
+                for new_record in new_records.sudo():
+                    new_values.setdefault(new_record.id, {})
+                    for fname in rule.fields:
+                        field = new_record._fields[fname]
+                        new_values[new_record.id][fname] = field.convert_to_read(
+                            new_record[fname], new_record
+                        )
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    new_records.ids,
+                    "create",
+                    None,
+                    new_values,
+                    {"log_type": log_type},
+                )
             return new_records
 
         @api.model_create_multi
@@ -311,42 +589,43 @@ class AuditlogRule(models.Model):
         def create_fast(self, vals_list, **kwargs):
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
-            vals_list2 = copy.deepcopy(vals_list)
-            new_records = create_fast.origin(self, vals_list, **kwargs)
-            new_values = {}
-            for vals, new_record in zip(vals_list2, new_records):
-                new_values.setdefault(new_record.id, vals)
-            if self.env.user in users_to_exclude:
-                return new_records
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                new_records.ids,
-                "create",
-                None,
-                new_values,
-                {"log_type": log_type},
-            )
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
+                return create_fast.origin(self, vals_list, **kwargs)
+            with stats.Measure(
+                self.env.cr, self._name, "create", len(vals_list)
+            ) as measure:
+                # Snapshot the values before `create()` alters them
+                audited_fields = set(rule.fields) - rule.fields_to_exclude
+                vals_list2 = [
+                    rule_model._get_fast_values(self, vals, audited_fields)
+                    for vals in vals_list
+                ]
+                with measure.pause():
+                    new_records = create_fast.origin(self, vals_list, **kwargs)
+                new_values = {}
+                for vals, new_record in zip(vals_list2, new_records):
+                    new_values.setdefault(new_record.id, vals)
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    new_records.ids,
+                    "create",
+                    None,
+                    new_values,
+                    {"log_type": log_type},
+                )
             return new_records
 
-        return create_full if self.log_type == "full" else create_fast
+        return create_fast if self.log_type == "fast" else create_full
 
     def _make_read(self):
         """Instanciate a read method that log its calls."""
         self.ensure_one()
         log_type = self.log_type
-        users_to_exclude = self.mapped("users_to_exclude_ids")
 
         def read(self, fields=None, load="_classic_read", **kwargs):
             result = read.origin(self, fields, load, **kwargs)
-            # Sometimes the result is not a list but a dictionary
-            # Also, we can not modify the current result as it will break calls
-            result2 = result
-            if not isinstance(result2, list):
-                result2 = [result]
-            read_values = {d["id"]: d for d in result2}
-            # Old API
-
             # If the call came from auditlog itself, skip logging:
             # avoid logs on `read` produced by auditlog during internal
             # processing: read data of relevant records, 'ir.model',
@@ -355,17 +634,37 @@ class AuditlogRule(models.Model):
                 return result
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
-            if self.env.user in users_to_exclude:
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
                 return result
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                self.ids,
-                "read",
-                read_values,
-                None,
-                {"log_type": log_type},
-            )
+            with stats.Measure(self.env.cr, self._name, "read", len(self)):
+                res_ids = rule_model._sample_reads(rule, self._name, self.ids)
+                if not res_ids:
+                    return result
+                # Sometimes the result is not a list but a dictionary
+                # Also, we can not modify the current result as it will break
+                # calls
+                result2 = result
+                if not isinstance(result2, list):
+                    result2 = [result]
+                if rule.read_mode == "aggregated":
+                    field_names = [
+                        field_name
+                        for field_name in (result2[0] if result2 else EMPTY_DICT)
+                        if field_name not in rule.fields_to_exclude
+                    ]
+                    rule_model.sudo()._aggregate_reads(self._name, res_ids, field_names)
+                    return result
+                read_values = {d["id"]: d for d in result2}
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    res_ids,
+                    "read",
+                    read_values,
+                    None,
+                    {"log_type": log_type},
+                )
             return result
 
         return read
@@ -374,110 +673,124 @@ class AuditlogRule(models.Model):
         """Instanciate a write method that log its calls."""
         self.ensure_one()
         log_type = self.log_type
-        users_to_exclude = self.mapped("users_to_exclude_ids")
 
         def write_full(self, vals, **kwargs):
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
-            fields_list = rule_model.get_auditlog_fields(self)
-            old_values = {
-                d["id"]: d
-                for d in self.sudo()
-                .with_context(prefetch_fields=False)
-                .read(fields_list)
-            }
-            result = write_full.origin(self, vals, **kwargs)
-            new_values = {
-                d["id"]: d
-                for d in self.sudo()
-                .with_context(prefetch_fields=False)
-                .read(fields_list)
-            }
-            if self.env.user in users_to_exclude:
-                return result
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                self.ids,
-                "write",
-                old_values,
-                new_values,
-                {"log_type": log_type},
-            )
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
+                return write_full.origin(self, vals, **kwargs)
+            if log_type == "smart":
+                fields_list = rule_model._get_write_fields(self, vals, rule.fields)
+            else:
+                fields_list = list(rule.fields)
+            if not fields_list:
+                # No audited field can change, e.g. on `write({})`: reading
+                # an empty list of fields would read all of them
+                return write_full.origin(self, vals, **kwargs)
+            with stats.Measure(self.env.cr, self._name, "write", len(self)) as measure:
+                old_values = {
+                    d["id"]: d
+                    for d in self.sudo()
+                    .with_context(prefetch_fields=False)
+                    .read(fields_list)
+                }
+                with measure.pause():
+                    result = write_full.origin(self, vals, **kwargs)
+                new_values = {
+                    d["id"]: d
+                    for d in self.sudo()
+                    .with_context(prefetch_fields=False)
+                    .read(fields_list)
+                }
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    self.ids,
+                    "write",
+                    old_values,
+                    new_values,
+                    {"log_type": log_type},
+                )
             return result
 
         def write_fast(self, vals, **kwargs):
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
-            # Log the user input only, no matter if the `vals` is updated
-            # afterwards as it could not represent the real state
-            # of the data in the database
-            vals2 = dict(vals)
-            old_vals2 = dict.fromkeys(list(vals2.keys()), False)
-            old_values = {id_: old_vals2 for id_ in self.ids}
-            new_values = {id_: vals2 for id_ in self.ids}
-            result = write_fast.origin(self, vals, **kwargs)
-            if self.env.user in users_to_exclude:
-                return result
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                self.ids,
-                "write",
-                old_values,
-                new_values,
-                {"log_type": log_type},
-            )
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
+                return write_fast.origin(self, vals, **kwargs)
+            with stats.Measure(self.env.cr, self._name, "write", len(self)) as measure:
+                # Log the user input only, no matter if the `vals` is updated
+                # afterwards as it could not represent the real state
+                # of the data in the database
+                vals2 = dict(vals)
+                old_vals2 = dict.fromkeys(list(vals2.keys()), False)
+                old_values = {id_: old_vals2 for id_ in self.ids}
+                new_values = {id_: vals2 for id_ in self.ids}
+                with measure.pause():
+                    result = write_fast.origin(self, vals, **kwargs)
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    self.ids,
+                    "write",
+                    old_values,
+                    new_values,
+                    {"log_type": log_type},
+                )
             return result
 
-        return write_full if self.log_type == "full" else write_fast
+        return write_fast if self.log_type == "fast" else write_full
 
     def _make_unlink(self):
         """Instanciate an unlink method that log its calls."""
         self.ensure_one()
         log_type = self.log_type
-        users_to_exclude = self.mapped("users_to_exclude_ids")
 
         def unlink_full(self, **kwargs):
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
-            fields_list = rule_model.get_auditlog_fields(self)
-            old_values = {
-                d["id"]: d
-                for d in self.sudo()
-                .with_context(prefetch_fields=False)
-                .read(fields_list)
-            }
-            if self.env.user in users_to_exclude:
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
                 return unlink_full.origin(self, **kwargs)
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                self.ids,
-                "unlink",
-                old_values,
-                None,
-                {"log_type": log_type},
-            )
+            with stats.Measure(self.env.cr, self._name, "unlink", len(self)):
+                old_values = {
+                    d["id"]: d
+                    for d in self.sudo()
+                    .with_context(prefetch_fields=False)
+                    .read(list(rule.fields))
+                }
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    self.ids,
+                    "unlink",
+                    old_values,
+                    None,
+                    {"log_type": log_type},
+                )
             return unlink_full.origin(self, **kwargs)
 
         def unlink_fast(self, **kwargs):
             self = self.with_context(auditlog_disabled=True)
             rule_model = self.env["auditlog.rule"]
-            if self.env.user in users_to_exclude:
+            rule = rule_model._get_compiled_rule(self._name)
+            if rule is None or self.env.uid in rule.users_to_exclude:
                 return unlink_fast.origin(self, **kwargs)
-            rule_model.sudo().create_logs(
-                self.env.uid,
-                self._name,
-                self.ids,
-                "unlink",
-                None,
-                None,
-                {"log_type": log_type},
-            )
+            with stats.Measure(self.env.cr, self._name, "unlink", len(self)):
+                rule_model.sudo().create_logs(
+                    self.env.uid,
+                    self._name,
+                    self.ids,
+                    "unlink",
+                    None,
+                    None,
+                    {"log_type": log_type},
+                )
             return unlink_fast.origin(self, **kwargs)
 
-        return unlink_full if self.log_type == "full" else unlink_fast
+        return unlink_fast if self.log_type == "fast" else unlink_full
 
     def create_logs(
         self,
@@ -488,99 +801,724 @@ class AuditlogRule(models.Model):
         old_values=None,
         new_values=None,
         additional_log_values=None,
+        res_names=None,
     ):
         """Create logs. `old_values` and `new_values` are dictionaries, e.g:
         {RES_ID: {'FIELD': VALUE, ...}}
+        `res_names` can provide the already known names of the records, e.g:
+        {RES_ID: NAME}
         """
         if old_values is None:
             old_values = EMPTY_DICT
         if new_values is None:
             new_values = EMPTY_DICT
+        if res_names is None:
+            res_names = EMPTY_DICT
         log_model = self.env["auditlog.log"]
+        log_line_model = self.env["auditlog.log.line"]
         http_request_model = self.env["auditlog.http.request"]
         http_session_model = self.env["auditlog.http.session"]
-        model_model = self.env[res_model]
-        model_id = self.pool._auditlog_model_cache[res_model]
-        auditlog_rule = self.env["auditlog.rule"].search([("model_id", "=", model_id)])
-        fields_to_exclude = auditlog_rule.fields_to_exclude_ids.mapped("name")
+        auditlog_rule = self._get_compiled_rule(res_model)
+        if auditlog_rule is None:
+            return log_model
+        model_id = auditlog_rule.model_id
+        if auditlog_rule.logging_mode != "sync" and not self.env.context.get(
+            "auditlog_flush"
+        ):
+            self._defer_logs(
+                auditlog_rule.logging_mode,
+                uid,
+                res_model,
+                res_ids,
+                method,
+                old_values,
+                new_values,
+                additional_log_values,
+            )
+            return log_model
+        additional_log_values = additional_log_values or EMPTY_DICT
+        # The HTTP context can already be known for deferred logs
+        http_request_id = additional_log_values.get("http_request_id")
+        if http_request_id is None:
+            http_request_id = http_request_model.current_http_request()
+        http_session_id = additional_log_values.get("http_session_id")
+        if http_session_id is None:
+            http_session_id = http_session_model.current_http_session()
+        res_names = self._get_res_names(res_model, res_ids, res_names)
+        if auditlog_rule.sink != "database":
+            self._send_events(
+                auditlog_rule,
+                uid,
+                res_ids,
+                method,
+                old_values,
+                new_values,
+                dict(
+                    additional_log_values,
+                    http_request_id=http_request_id,
+                    http_session_id=http_session_id,
+                ),
+                res_names,
+            )
+            return log_model
+        log_vals_list = []
         for res_id in res_ids:
-            name = model_model.browse(res_id).name_get()
-            res_name = name and name[0] and name[0][1]
             vals = {
-                "name": res_name,
+                "name": res_names.get(res_id, False),
                 "model_id": model_id,
                 "res_id": res_id,
                 "method": method,
                 "user_id": uid,
-                "http_request_id": http_request_model.current_http_request(),
-                "http_session_id": http_session_model.current_http_session(),
+                "http_request_id": http_request_id,
+                "http_session_id": http_session_id,
             }
-            vals.update(additional_log_values or {})
-            log = log_model.create(vals)
+            vals.update(additional_log_values)
+            log_vals_list.append(vals)
+        # Insert all the logs at once, then all their lines at once
+        logs = log_model.create(log_vals_list)
+        log_fields = self._collect_log_fields(
+            auditlog_rule, method, logs, old_values, new_values
+        )
+        log_line_vals_list = self._prepare_log_lines_vals(
+            method, log_fields, old_values, new_values, rule=auditlog_rule
+        )
+        if auditlog_rule.compact_storage:
+            self._store_compact_changes(logs, log_fields, log_line_vals_list)
+        elif log_line_vals_list:
+            log_line_model.create(log_line_vals_list)
+        stats.add(
+            self.env.cr,
+            res_model,
+            method,
+            logs=len(logs),
+            lines=len(log_line_vals_list),
+        )
+        return logs
+
+    def _get_res_names(self, res_model, res_ids, res_names):
+        """Return the names of the records `res_ids` of `res_model`, completing
+        the already known `res_names`: {RES_ID: NAME}
+        """
+        res_names = dict(res_names)
+        records = self.env[res_model].browse(
+            [res_id for res_id in res_ids if res_id not in res_names]
+        )
+        if self.env.context.get("auditlog_flush"):
+            # Deferred logs can target records deleted in the meantime
+            records = records.exists()
+        res_names.update(records.name_get())
+        return res_names
+
+    def _collect_log_fields(self, rule, method, logs, old_values, new_values):
+        """Return the `(log, field)` pairs of the fields to log for each log of
+        `logs`, according to the compiled `rule`.
+        """
+        log_fields = []
+        for log in logs:
+            res_id = log.res_id
             diff = DictDiffer(
                 new_values.get(res_id, EMPTY_DICT), old_values.get(res_id, EMPTY_DICT)
             )
             if method == "create":
-                self._create_log_line_on_create(
-                    log, diff.added(), new_values, fields_to_exclude
-                )
-            elif method == "read":
-                self._create_log_line_on_read(
-                    log,
-                    list(old_values.get(res_id, EMPTY_DICT).keys()),
-                    old_values,
-                    fields_to_exclude,
-                )
+                fields_list = diff.added()
             elif method == "write":
-                self._create_log_line_on_write(
-                    log, diff.changed(), old_values, new_values, fields_to_exclude
-                )
-            elif method == "unlink" and auditlog_rule.capture_record:
-                self._create_log_line_on_read(
-                    log,
-                    list(old_values.get(res_id, EMPTY_DICT).keys()),
-                    old_values,
-                    fields_to_exclude,
+                fields_list = diff.changed()
+            elif method == "read" or (method == "unlink" and rule.capture_record):
+                fields_list = list(old_values.get(res_id, EMPTY_DICT).keys())
+            else:
+                continue
+            log_fields.extend(
+                (log, field)
+                for field in self._get_log_fields(
+                    log, fields_list, rule.fields_to_exclude
                 )
+            )
+        return log_fields
 
-    def _get_field(self, model, field_name):
-        cache = self.pool._auditlog_field_cache
-        if field_name not in cache.get(model.model, {}):
-            cache.setdefault(model.model, {})
-            # - we use 'search()' then 'read()' instead of the 'search_read()'
-            #   to take advantage of the 'classic_write' loading
-            # - search the field in the current model and those it inherits
-            field_model = self.env["ir.model.fields"].sudo()
-            all_model_ids = [model.id]
-            all_model_ids.extend(model.inherited_model_ids.ids)
-            field = field_model.search(
-                [("model_id", "in", all_model_ids), ("name", "=", field_name)]
+    def _send_events(
+        self,
+        rule,
+        uid,
+        res_ids,
+        method,
+        old_values,
+        new_values,
+        additional_log_values,
+        res_names,
+    ):
+        """Turn the logs of a `create_logs()` call into audit events, sent to
+        the sink of the compiled `rule` once the transaction is committed.
+        """
+        log_values = dict(additional_log_values)
+        log_type = log_values.pop("log_type", rule.log_type)
+        ir_model = self.env["ir.model"].browse(rule.model_id)
+        logs = [
+            EventLog(None, res_id, method, log_type, ir_model) for res_id in res_ids
+        ]
+        log_fields = self._collect_log_fields(
+            rule, method, logs, old_values, new_values
+        )
+        log_line_vals_list = self._prepare_log_lines_vals(
+            method, log_fields, old_values, new_values, rule=rule
+        )
+        changes_by_res_id = {}
+        for (log, field), vals in zip(log_fields, log_line_vals_list):
+            changes_by_res_id.setdefault(log.res_id, []).append(
+                {
+                    "field_name": field["name"],
+                    "field_description": field["field_description"],
+                    "old": vals["old_value"],
+                    "new": vals["new_value"],
+                    "old_text": vals["old_value_text"],
+                    "new_text": vals["new_value_text"],
+                }
             )
-            # The field can be a dummy one, like 'in_group_X' on 'res.users'
-            # As such we can't log it (field_id is required to create a log)
-            if not field:
-                cache[model.model][field_name] = False
-            else:
-                field_data = field.read(load="_classic_write")[0]
-                cache[model.model][field_name] = field_data
-        return cache[model.model][field_name]
+        create_date = fields.Datetime.to_string(fields.Datetime.now())
+        events = []
+        for res_id in res_ids:
+            event = {
+                "db": self.env.cr.dbname,
+                "create_date": create_date,
+                "model": ir_model.model,
+                "res_id": res_id,
+                "name": res_names.get(res_id, False),
+                "method": method,
+                "log_type": log_type,
+                "user_id": uid,
+                "changes": changes_by_res_id.get(res_id, []),
+            }
+            event.update(log_values)
+            events.append(event)
+        # Like the deferred logs, the events are kept in the precommit data
+        # until the transaction is flushed, see `_defer_logs()`
+        callbacks = self.env.cr.precommit
+        if SINK_EVENTS_KEY not in callbacks.data:
+            callbacks.data[SINK_EVENTS_KEY] = {}
+            callbacks.add(self._queue_events)
+        callbacks.data[SINK_EVENTS_KEY].setdefault(rule.sink, []).extend(events)
+        stats.add(
+            self.env.cr,
+            ir_model.model,
+            method,
+            logs=len(events),
+            lines=len(log_line_vals_list),
+        )
 
-    def _create_log_line_on_read(
-        self, log, fields_list, read_values, fields_to_exclude
+    def _queue_events(self):
+        """Keep the audit events of the flushed transaction until it is
+        committed.
+        """
+        events_by_sink = self.env.cr.precommit.data.pop(SINK_EVENTS_KEY, None)
+        if not events_by_sink:
+            return
+        callbacks = self.env.cr.postcommit
+        if SINK_EVENTS_KEY not in callbacks.data:
+            callbacks.data[SINK_EVENTS_KEY] = {}
+            callbacks.add(self._flush_events)
+        for sink_name, events in events_by_sink.items():
+            callbacks.data[SINK_EVENTS_KEY].setdefault(sink_name, []).extend(events)
+
+    def _flush_events(self):
+        """Send the audit events of the committed transaction to their sinks,
+        one batch per sink.
+        """
+        events_by_sink = self.env.cr.postcommit.data.pop(SINK_EVENTS_KEY, None)
+        for sink_name, events in (events_by_sink or EMPTY_DICT).items():
+            try:
+                get_sink(sink_name).send(events)
+            except Exception:
+                _logger.exception(
+                    "Unable to send %s audit events to the '%s' sink",
+                    len(events),
+                    sink_name,
+                )
+
+    def _defer_logs(
+        self,
+        logging_mode,
+        uid,
+        res_model,
+        res_ids,
+        method,
+        old_values,
+        new_values,
+        additional_log_values,
     ):
-        """Log field filled on a 'read' operation."""
-        log_line_model = self.env["auditlog.log.line"]
-        fields_to_exclude = fields_to_exclude + FIELDS_BLACKLIST
+        """Keep the arguments of a `create_logs()` call in a buffer of the
+        cursor, to write them later with the other deferred logs.
+        """
+        additional_log_values = dict(additional_log_values or {})
+        # The HTTP request is over when the background writer runs
+        additional_log_values.setdefault(
+            "http_request_id",
+            self.env["auditlog.http.request"].current_http_request(),
+        )
+        additional_log_values.setdefault(
+            "http_session_id",
+            self.env["auditlog.http.session"].current_http_session(),
+        )
+        res_names = {}
+        if method == "unlink":
+            # Deleted records can't be named anymore once the buffer is flushed
+            res_names = dict(self.env[res_model].browse(res_ids).name_get())
+        entry = {
+            "uid": uid,
+            "res_model": res_model,
+            "res_ids": list(res_ids),
+            "method": method,
+            # Values can be updated by the caller once the operation is done
+            "old_values": {
+                res_id: dict(values) for res_id, values in old_values.items()
+            },
+            "new_values": {
+                res_id: dict(values) for res_id, values in new_values.items()
+            },
+            "additional_log_values": additional_log_values,
+            "res_names": res_names,
+        }
+        # The buffer is kept in the precommit data, which a savepoint drops
+        # when it is rolled back along with the logged operations
+        callbacks = self.env.cr.precommit
+        if DEFERRED_LOGS_KEY not in callbacks.data:
+            callbacks.data[DEFERRED_LOGS_KEY] = {
+                "precommit": [],
+                "async": [],
+                "size": 0,
+            }
+            callbacks.add(self._flush_deferred_logs)
+        buffer = callbacks.data[DEFERRED_LOGS_KEY]
+        buffer[logging_mode].append(entry)
+        buffer["size"] += len(entry["res_ids"])
+        buffer_size = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("auditlog.deferred_buffer_size", 10000)
+        )
+        if buffer["size"] > buffer_size:
+            # The buffer overflows: fallback to synchronous writes
+            entries = buffer["precommit"] + buffer["async"]
+            buffer["precommit"], buffer["async"], buffer["size"] = [], [], 0
+            self._write_deferred_logs(entries)
+
+    def _flush_deferred_logs(self):
+        """Write the logs deferred to the end of the transaction, and keep the
+        asynchronous ones until the transaction is committed.
+        """
+        buffer = self.env.cr.precommit.data.pop(DEFERRED_LOGS_KEY, None)
+        if not buffer:
+            return
+        if buffer["async"]:
+            callbacks = self.env.cr.postcommit
+            if DEFERRED_LOGS_KEY not in callbacks.data:
+                callbacks.data[DEFERRED_LOGS_KEY] = []
+                callbacks.add(self._push_deferred_logs)
+            callbacks.data[DEFERRED_LOGS_KEY].extend(buffer["async"])
+        if buffer["precommit"]:
+            self._write_deferred_logs(buffer["precommit"])
+            self.env.flush_all()
+
+    def _push_deferred_logs(self):
+        """Hand the logs of the committed transaction over to the background
+        writer, or write them in a new transaction if its queue is full.
+        """
+        entries = self.env.cr.postcommit.data.pop(DEFERRED_LOGS_KEY, None)
+        if not entries:
+            return
+        if not get_writer(self.env.cr.dbname).push(entries):
+            with self.pool.cursor() as cr:
+                self.with_env(self.env(cr=cr))._write_deferred_logs(entries)
+
+    @api.model
+    def _write_deferred_logs(self, entries):
+        """Write deferred logs, merging the entries sharing the same model,
+        method, user and log values into a single `create_logs()` call.
+        """
+        batches = {}
+        for entry in entries:
+            key = (
+                entry["uid"],
+                entry["res_model"],
+                entry["method"],
+                tuple(sorted(entry["additional_log_values"].items())),
+            )
+            batch = batches.get(key)
+            # A record logged twice gets two logs, so two batches
+            if batch is None or not batch["ids"].isdisjoint(entry["res_ids"]):
+                if batch is not None:
+                    self._write_deferred_logs_batch(batch)
+                batch = batches[key] = {
+                    "entry": dict(entry, res_ids=[]),
+                    "ids": set(),
+                }
+                for values_key in ("old_values", "new_values", "res_names"):
+                    batch["entry"][values_key] = {}
+            for values_key in ("old_values", "new_values", "res_names"):
+                batch["entry"][values_key].update(entry[values_key])
+            batch["entry"]["res_ids"] += entry["res_ids"]
+            batch["ids"].update(entry["res_ids"])
+        for batch in batches.values():
+            self._write_deferred_logs_batch(batch)
+
+    def _write_deferred_logs_batch(self, batch):
+        entry = batch["entry"]
+        # The calls were counted when the logs were deferred
+        with stats.Measure(self.env.cr, entry["res_model"], entry["method"], calls=0):
+            self.sudo().with_context(
+                auditlog_disabled=True, auditlog_flush=True
+            ).create_logs(
+                entry["uid"],
+                entry["res_model"],
+                entry["res_ids"],
+                entry["method"],
+                entry["old_values"],
+                entry["new_values"],
+                entry["additional_log_values"],
+                res_names=entry["res_names"],
+            )
+
+    @api.model
+    def _sample_reads(self, rule, res_model, res_ids):
+        """Return the ids among `res_ids` whose read has to be logged
+        according to the read sampling and deduplication of `rule`.
+        """
+        if rule.read_sample_rate > 1:
+            counter = _read_counters[(self.env.cr.dbname, res_model)]
+            if next(counter) % rule.read_sample_rate:
+                return []
+        if rule.read_dedup_window <= 0:
+            return res_ids
+        now = time.monotonic()
+        deadline = now - rule.read_dedup_window
+        key_prefix = (self.env.cr.dbname, self.env.uid, res_model)
+        sampled_ids = []
+        with _read_cache_lock:
+            for res_id in res_ids:
+                key = key_prefix + (res_id,)
+                last_read = _read_cache.get(key)
+                if last_read is not None and last_read > deadline:
+                    continue
+                _read_cache[key] = now
+                _read_cache.move_to_end(key)
+                sampled_ids.append(res_id)
+            while len(_read_cache) > READ_CACHE_SIZE:
+                _read_cache.popitem(last=False)
+        return sampled_ids
+
+    @api.model
+    def _aggregate_reads(self, res_model, res_ids, field_names):
+        """Add a read to the aggregated read log of the current user on the
+        model `res_model`, written at the end of the transaction.
+        """
+        callbacks = self.env.cr.precommit
+        if AGGREGATED_READS_KEY not in callbacks.data:
+            callbacks.data[AGGREGATED_READS_KEY] = {}
+            callbacks.add(self._flush_aggregated_reads)
+        reads = callbacks.data[AGGREGATED_READS_KEY]
+        key = (self.env.uid, res_model)
+        if key not in reads:
+            reads[key] = {
+                # Dictionaries are used as ordered sets
+                "res_ids": {},
+                "field_names": {},
+                "http_request_id": self.env[
+                    "auditlog.http.request"
+                ].current_http_request(),
+                "http_session_id": self.env[
+                    "auditlog.http.session"
+                ].current_http_session(),
+            }
+        read = reads[key]
+        read["res_ids"].update(dict.fromkeys(res_ids))
+        read["field_names"].update(dict.fromkeys(field_names))
+
+    def _flush_aggregated_reads(self):
+        """Write the aggregated read logs of the transaction."""
+        reads = self.env.cr.precommit.data.pop(AGGREGATED_READS_KEY, None)
+        if not reads:
+            return
+        log_vals_list = []
+        for (uid, res_model), read in reads.items():
+            rule = self._get_compiled_rule(res_model)
+            if rule is None:
+                continue
+            log_vals_list.append(
+                {
+                    "name": _("%s records") % len(read["res_ids"]),
+                    "model_id": rule.model_id,
+                    "method": "read",
+                    "user_id": uid,
+                    "res_ids": list(read["res_ids"]),
+                    "read_field_names": ",".join(read["field_names"]),
+                    "http_request_id": read["http_request_id"],
+                    "http_session_id": read["http_session_id"],
+                    "log_type": rule.log_type,
+                }
+            )
+            stats.add(self.env.cr, res_model, "read", logs=1)
+        self.env["auditlog.log"].sudo().create(log_vals_list)
+        self.env.flush_all()
+
+    @api.model
+    @ormcache("model_name")
+    def _get_model_fields(self, model_name):
+        """Return the data of all the fields of the model `model_name` and
+        of the models it inherits, as a dictionary:
+        {FIELD_NAME: {'id': ..., 'name': ..., 'ttype': ..., ...}}
+        The result is cached by the registry, the cache being cleared when
+        fields are updated.
+        """
+        model = self.env["ir.model"].sudo()._get(model_name)
+        # Fields of the model itself take precedence over the inherited ones
+        all_model_ids = model.inherited_model_ids.ids + model.ids
+        # - we use 'search()' then 'read()' instead of the 'search_read()'
+        #   to take advantage of the 'classic_write' loading
+        fields_data = (
+            self.env["ir.model.fields"]
+            .sudo()
+            .search([("model_id", "in", all_model_ids)])
+            .read(load="_classic_write")
+        )
+        fields_data.sort(key=lambda data: all_model_ids.index(data["model_id"]))
+        return {data["name"]: data for data in fields_data}
+
+    def _get_field(self, model, field_name):
+        # The field can be a dummy one, like 'in_group_X' on 'res.users'
+        # As such we can't log it (field_id is required to create a log)
+        return self._get_model_fields(model.model).get(field_name, False)
+
+    def _store_compact_changes(self, logs, log_fields, log_line_vals_list):
+        """Store the log lines values of each log in its `changes` column as
+        a JSON list, with one entry per field:
+        [{'field_id': ..., 'field_name': ..., 'field_description': ...,
+          'old': ..., 'new': ..., 'old_text': ..., 'new_text': ...}, ...]
+        `old_text` and `new_text` are only set when they differ from the raw
+        values.
+        """
+        changes_by_log = {}
+        for (log, field), vals in zip(log_fields, log_line_vals_list):
+            change = {
+                "field_id": field["id"],
+                "field_name": field["name"],
+                "field_description": field["field_description"],
+            }
+            for key in ("old", "new"):
+                value = vals["%s_value" % key]
+                change[key] = self._get_compact_value(field, value)
+                text = vals["%s_value_text" % key]
+                if text != value:
+                    change["%s_text" % key] = self._get_compact_value(field, text)
+            changes_by_log.setdefault(log.id, []).append(change)
+        if not changes_by_log:
+            return
+        # Set the changes of all the logs with a single query
+        self.env.cr.execute(
+            """
+            UPDATE auditlog_log AS alog
+            SET changes = changes_by_log.changes
+            FROM unnest(%s::integer[], %s::jsonb[]) AS changes_by_log(id, changes)
+            WHERE alog.id = changes_by_log.id
+            """,
+            (
+                list(changes_by_log),
+                [
+                    json.dumps(changes, default=str)
+                    for changes in changes_by_log.values()
+                ],
+            ),
+        )
+        logs.invalidate_recordset(["changes"])
+
+    @api.model
+    def _get_compact_value(self, field, value):
+        """Return `value` as stored in compact logs: unset values are `None`,
+        except for boolean fields.
+        """
+        if value is False and field["ttype"] != "boolean":
+            return None
+        return value
+
+    def _get_log_fields(self, log, fields_list, fields_to_exclude):
+        """Return the data of the fields to log among `fields_list`."""
+        log_fields = []
         for field_name in fields_list:
             if field_name in fields_to_exclude:
                 continue
             field = self._get_field(log.model_id, field_name)
             # not all fields have an ir.models.field entry (ie. related fields)
             if field:
-                log_vals = self._prepare_log_line_vals_on_read(log, field, read_values)
-                log_line_model.create(log_vals)
+                log_fields.append(field)
+        return log_fields
+
+    def _prepare_log_lines_vals(
+        self, method, log_fields, old_values, new_values, rule=None
+    ):
+        """Prepare the values of the lines of the `(log, field)` pairs of
+        `log_fields`, large values being summarized according to the compiled
+        `rule`.
+        """
+        # Name the related records of all the logs at once
+        names = self._get_x2many_names(log_fields, old_values, new_values)
+        vals_list = []
+        for log, field in log_fields:
+            if method == "create":
+                vals = self._prepare_log_line_vals_on_create(
+                    log, field, new_values, names=names
+                )
+            elif method == "write":
+                vals = self._prepare_log_line_vals_on_write(
+                    log, field, old_values, new_values, names=names
+                )
+            else:
+                vals = self._prepare_log_line_vals_on_read(
+                    log, field, old_values, names=names
+                )
+            if (
+                rule is not None
+                and rule.value_size_limit > 0
+                and field["ttype"] in SUMMARIZED_FIELD_TYPES
+            ):
+                self._summarize_log_line_vals(rule, field, vals)
+            vals_list.append(vals)
+        return vals_list
+
+    def _summarize_log_line_vals(self, rule, field, vals):
+        """Replace the values of the log line `vals` larger than the size
+        limit of the compiled `rule` by their digest. The text of the new
+        value is then the diff between the old and new texts if `rule` logs
+        text diffs.
+        """
+        large_keys = [
+            key
+            for key in ("old_value", "new_value")
+            if self._is_large_value(vals[key], rule.value_size_limit)
+        ]
+        if not large_keys:
+            return vals
+        old_value, new_value = vals["old_value"], vals["new_value"]
+        diff = None
+        if (
+            rule.log_text_diff
+            and isinstance(old_value, str)
+            and isinstance(new_value, str)
+        ):
+            diff = "\n".join(
+                difflib.unified_diff(
+                    old_value.splitlines(),
+                    new_value.splitlines(),
+                    "old",
+                    "new",
+                    lineterm="",
+                )
+            )
+        for key in large_keys:
+            vals[key] = vals["%s_text" % key] = self._get_value_digest(
+                vals[key], field["ttype"]
+            )
+        if diff is not None:
+            vals["new_value_text"] = diff
+        return vals
+
+    def _get_x2many_names(self, log_fields, old_values, new_values):
+        """Name the records related through the *2many fields of the
+        `(log, field)` pairs of `log_fields`, with one 'name_get()' per
+        related model:
+        {MODEL: {ID: NAME}}
+        Deleted records are not named.
+        """
+        ids_by_model = {}
+        for log, field in log_fields:
+            if not field["relation"] or "2many" not in field["ttype"]:
+                continue
+            # Values of 'fast' logs are the raw commands, not IDs
+            if log.log_type == "fast" and log.method != "read":
+                continue
+            related_ids = ids_by_model.setdefault(field["relation"], set())
+            for values in (old_values, new_values):
+                value = values.get(log.res_id, EMPTY_DICT).get(field["name"])
+                if value:
+                    related_ids.update(value)
+        names = {}
+        for model, related_ids in ids_by_model.items():
+            # Filter IDs to prevent a 'name_get()' call on deleted resources
+            records = self.env[model].browse(related_ids).exists()
+            names[model] = dict(records.name_get())
+        return names
+
+    def _get_x2many_value_text(self, field, value, names):
+        """Return the text representation of the *2many `value` of `field`,
+        deleted resources being represented with a 'DELETED' text.
+        """
+        model_names = names.get(field["relation"], EMPTY_DICT)
+        return [(id_, model_names.get(id_, "DELETED")) for id_ in value]
+
+    def _create_log_lines(
+        self, method, log, fields_list, old_values, new_values, fields_to_exclude
+    ):
+        """Create the lines of `log` for the fields of `fields_list`, with a
+        single insert.
+        """
+        fields_to_exclude = set(fields_to_exclude) | set(FIELDS_BLACKLIST)
+        log_fields = [
+            (log, field)
+            for field in self._get_log_fields(log, fields_list, fields_to_exclude)
+        ]
+        vals_list = self._prepare_log_lines_vals(
+            method, log_fields, old_values, new_values
+        )
+        return self.env["auditlog.log.line"].create(vals_list)
 
-    def _prepare_log_line_vals_on_read(self, log, field, read_values):
+    def _create_log_line_on_read(
+        self, log, fields_list, read_values, fields_to_exclude
+    ):
+        """Log field filled on a 'read' operation.
+
+        Deprecated: ``create_logs()`` creates the lines of all its logs at
+        once, without calling this method anymore.
+        """
+        warnings.warn(
+            "_create_log_line_on_read() is deprecated, use create_logs()",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self._create_log_lines(
+            "read", log, fields_list, read_values, EMPTY_DICT, fields_to_exclude
+        )
+
+    def _create_log_line_on_write(
+        self, log, fields_list, old_values, new_values, fields_to_exclude
+    ):
+        """Log field updated on a 'write' operation.
+
+        Deprecated: ``create_logs()`` creates the lines of all its logs at
+        once, without calling this method anymore.
+        """
+        warnings.warn(
+            "_create_log_line_on_write() is deprecated, use create_logs()",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self._create_log_lines(
+            "write", log, fields_list, old_values, new_values, fields_to_exclude
+        )
+
+    def _create_log_line_on_create(
+        self, log, fields_list, new_values, fields_to_exclude
+    ):
+        """Log field filled on a 'create' operation.
+
+        Deprecated: ``create_logs()`` creates the lines of all its logs at
+        once, without calling this method anymore.
+        """
+        warnings.warn(
+            "_create_log_line_on_create() is deprecated, use create_logs()",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self._create_log_lines(
+            "create", log, fields_list, EMPTY_DICT, new_values, fields_to_exclude
+        )
+
+    def _prepare_log_line_vals_on_read(self, log, field, read_values, names=None):
         """Prepare the dictionary of values used to create a log line on a
         'read' operation.
         """
@@ -593,30 +1531,16 @@ class AuditlogRule(models.Model):
             "new_value_text": False,
         }
         if field["relation"] and "2many" in field["ttype"]:
-            old_value_text = (
-                self.env[field["relation"]].browse(vals["old_value"]).name_get()
+            if names is None:
+                names = self._get_x2many_names([(log, field)], read_values, {})
+            vals["old_value_text"] = self._get_x2many_value_text(
+                field, vals["old_value"], names
             )
-            vals["old_value_text"] = old_value_text
         return vals
 
-    def _create_log_line_on_write(
-        self, log, fields_list, old_values, new_values, fields_to_exclude
+    def _prepare_log_line_vals_on_write(
+        self, log, field, old_values, new_values, names=None
     ):
-        """Log field updated on a 'write' operation."""
-        log_line_model = self.env["auditlog.log.line"]
-        fields_to_exclude = fields_to_exclude + FIELDS_BLACKLIST
-        for field_name in fields_list:
-            if field_name in fields_to_exclude:
-                continue
-            field = self._get_field(log.model_id, field_name)
-            # not all fields have an ir.models.field entry (ie. related fields)
-            if field:
-                log_vals = self._prepare_log_line_vals_on_write(
-                    log, field, old_values, new_values
-                )
-                log_line_model.create(log_vals)
-
-    def _prepare_log_line_vals_on_write(self, log, field, old_values, new_values):
         """Prepare the dictionary of values used to create a log line on a
         'write' operation.
         """
@@ -629,44 +1553,18 @@ class AuditlogRule(models.Model):
             "new_value_text": new_values[log.res_id][field["name"]],
         }
         # for *2many fields, log the name_get
-        if log.log_type == "full" and field["relation"] and "2many" in field["ttype"]:
-            # Filter IDs to prevent a 'name_get()' call on deleted resources
-            existing_ids = self.env[field["relation"]]._search(
-                [("id", "in", vals["old_value"])]
+        if log.log_type != "fast" and field["relation"] and "2many" in field["ttype"]:
+            if names is None:
+                names = self._get_x2many_names([(log, field)], old_values, new_values)
+            vals["old_value_text"] = self._get_x2many_value_text(
+                field, vals["old_value"], names
             )
-            old_value_text = []
-            if existing_ids:
-                existing_values = (
-                    self.env[field["relation"]].browse(existing_ids).name_get()
-                )
-                old_value_text.extend(existing_values)
-            # Deleted resources will have a 'DELETED' text representation
-            deleted_ids = set(vals["old_value"]) - set(existing_ids)
-            for deleted_id in deleted_ids:
-                old_value_text.append((deleted_id, "DELETED"))
-            vals["old_value_text"] = old_value_text
-            new_value_text = (
-                self.env[field["relation"]].browse(vals["new_value"]).name_get()
+            vals["new_value_text"] = self._get_x2many_value_text(
+                field, vals["new_value"], names
             )
-            vals["new_value_text"] = new_value_text
         return vals
 
-    def _create_log_line_on_create(
-        self, log, fields_list, new_values, fields_to_exclude
-    ):
-        """Log field filled on a 'create' operation."""
-        log_line_model = self.env["auditlog.log.line"]
-        fields_to_exclude = fields_to_exclude + FIELDS_BLACKLIST
-        for field_name in fields_list:
-            if field_name in fields_to_exclude:
-                continue
-            field = self._get_field(log.model_id, field_name)
-            # not all fields have an ir.models.field entry (ie. related fields)
-            if field:
-                log_vals = self._prepare_log_line_vals_on_create(log, field, new_values)
-                log_line_model.create(log_vals)
-
-    def _prepare_log_line_vals_on_create(self, log, field, new_values):
+    def _prepare_log_line_vals_on_create(self, log, field, new_values, names=None):
         """Prepare the dictionary of values used to create a log line on a
         'create' operation.
         """
@@ -678,11 +1576,12 @@ class AuditlogRule(models.Model):
             "new_value": new_values[log.res_id][field["name"]],
             "new_value_text": new_values[log.res_id][field["name"]],
         }
-        if log.log_type == "full" and field["relation"] and "2many" in field["ttype"]:
-            new_value_text = (
-                self.env[field["relation"]].browse(vals["new_value"]).name_get()
+        if log.log_type != "fast" and field["relation"] and "2many" in field["ttype"]:
+            if names is None:
+                names = self._get_x2many_names([(log, field)], {}, new_values)
+            vals["new_value_text"] = self._get_x2many_value_text(
+                field, vals["new_value"], names
             )
-            vals["new_value_text"] = new_value_text
         return vals
 
     def subscribe(self):
@@ -0,0 +1,205 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import abc
+import contextlib
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from logging.handlers import SysLogHandler
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# fsync policies of the file sink: after each event, after each batch of
+# events, or left to the operating system
+FSYNC_POLICIES = ("always", "batch", "never")
+# Policies of the queue sink when its queue is full: drop the events being
+# sent, or the oldest events of the queue to make room for them
+OVERFLOW_POLICIES = ("drop_new", "drop_oldest")
+# Default maximum number of events of the queue sink
+DEFAULT_QUEUE_SIZE = 10000
+# Tag of the syslog messages of the socket sink
+SYSLOG_TAG = "odoo-auditlog"
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+class AuditlogSink(abc.ABC):
+    """Destination of the audit events of the rules which don't store their
+    logs in the database. Events are dictionaries, sent by batches once the
+    transaction which produced them is committed.
+    """
+
+    @classmethod
+    def get_options(cls):
+        """Return the options of the sink read from the server configuration,
+        as a tuple of arguments of the constructor.
+        """
+        return ()
+
+    @abc.abstractmethod
+    def send(self, events):
+        """Send the list of `events`."""
+
+    @staticmethod
+    def serialize(event):
+        return json.dumps(event, default=str, sort_keys=True)
+
+
+class FileSink(AuditlogSink):
+    """Append events as JSON lines to a local file, rotated once it reaches
+    `max_bytes` bytes, `backup_count` rotated files being kept. The path of
+    the file must be absolute, the file is stored in the data directory of
+    the server by default.
+    """
+
+    def __init__(self, path, max_bytes=0, backup_count=0, fsync="batch"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError("Unknown fsync policy %r" % fsync)
+        if not os.path.isabs(path):
+            raise ValueError("The path of the audit events file must be absolute")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fsync = fsync
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_options(cls):
+        return (
+            config.get("auditlog_sink_file")
+            or os.path.join(config["data_dir"], "auditlog.jsonl"),
+            int(config.get("auditlog_sink_file_max_bytes") or 0),
+            int(config.get("auditlog_sink_file_backup_count") or 0),
+            config.get("auditlog_sink_fsync") or "batch",
+        )
+
+    def send(self, events):
+        lines = [(self.serialize(event) + "\n").encode() for event in events]
+        with self.lock:
+            self._rotate(sum(len(line) for line in lines))
+            # The file is opened for each batch to follow external rotations
+            with open(self.path, "ab") as sink_file:
+                for line in lines:
+                    sink_file.write(line)
+                    if self.fsync == "always":
+                        sink_file.flush()
+                        os.fsync(sink_file.fileno())
+                if self.fsync == "batch":
+                    sink_file.flush()
+                    os.fsync(sink_file.fileno())
+
+    def _rotate(self, size):
+        """Rotate the file if writing `size` more bytes would exceed its
+        maximum size.
+        """
+        if not self.max_bytes or not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) + size <= self.max_bytes:
+            return
+        if not self.backup_count:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            backup = "%s.%s" % (self.path, index)
+            if os.path.exists(backup):
+                os.replace(backup, "%s.%s" % (self.path, index + 1))
+        os.replace(self.path, "%s.1" % self.path)
+
+
+class SocketSink(AuditlogSink):
+    """Send each event as a syslog message (RFC 3164) in a datagram to a
+    local UNIX socket, the one of the syslog daemon by default.
+    """
+
+    def __init__(self, path, facility="user"):
+        self.path = path
+        # <PRI> header of the messages, of the informational severity
+        self.header = "<%d>%s: " % (
+            SysLogHandler.facility_names[facility] << 3 | SysLogHandler.LOG_INFO,
+            SYSLOG_TAG,
+        )
+        self.lock = threading.Lock()
+        self.socket = None
+
+    @classmethod
+    def get_options(cls):
+        return (
+            config.get("auditlog_sink_socket") or "/dev/log",
+            config.get("auditlog_sink_syslog_facility") or "user",
+        )
+
+    def send(self, events):
+        with self.lock:
+            if self.socket is None:
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            for event in events:
+                message = self.header + self.serialize(event)
+                self.socket.sendto(message.encode(), self.path)
+
+
+class QueueSink(AuditlogSink):
+    """Put events in a bounded in-memory queue, for a consumer running in
+    the server process. When the queue is full, either the events being sent
+    or the oldest events of the queue are dropped, depending on `overflow`.
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, overflow="drop_new"):
+        if maxsize <= 0:
+            raise ValueError("The size of the audit events queue must be positive")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy %r" % overflow)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflow = overflow
+
+    @classmethod
+    def get_options(cls):
+        return (
+            int(config.get("auditlog_sink_queue_size") or DEFAULT_QUEUE_SIZE),
+            config.get("auditlog_sink_queue_overflow") or "drop_new",
+        )
+
+    def send(self, events):
+        dropped = 0
+        for index, event in enumerate(events):
+            if self.overflow == "drop_new":
+                try:
+                    self.queue.put_nowait(event)
+                except queue.Full:
+                    dropped = len(events) - index
+                    break
+                continue
+            while True:
+                try:
+                    self.queue.put_nowait(event)
+                    break
+                except queue.Full:
+                    # The consumer may empty the queue in the meantime
+                    with contextlib.suppress(queue.Empty):
+                        self.queue.get_nowait()
+                        dropped += 1
+        if dropped:
+            _logger.warning("Audit events queue full: %s events dropped", dropped)
+
+
+# Available sinks: {NAME: (LABEL, CLASS)}
+SINKS = {
+    "file": ("Append-only file", FileSink),
+    "socket": ("UNIX socket", SocketSink),
+    "queue": ("In-memory queue", QueueSink),
+}
+
+
+def get_sink(name):
+    """Return the sink `name` configured from the server configuration."""
+    sink_class = SINKS[name][1]
+    key = (name, sink_class.get_options())
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = _sinks[key] = sink_class(*key[1])
+        return sink
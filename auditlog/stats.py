@@ -0,0 +1,129 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# Figures counted per model and operation: number of audited calls and
+# records, number of logs and log lines written, number of queries and time
+# (in seconds) spent by auditlog
+FIGURES = ("calls", "records", "logs", "lines", "queries", "time")
+
+_stats = {}
+_stats_lock = threading.Lock()
+_last_dump = time.monotonic()
+
+
+def add(cr, model, operation, **figures):
+    """Add `figures` to the counters of `operation` on `model`, both on the
+    cursor `cr` (in its `auditlog_stats` attribute) and on the counters of
+    the server process.
+    """
+    cr_stats = getattr(cr, "auditlog_stats", None)
+    if cr_stats is None:
+        cr_stats = cr.auditlog_stats = {}
+    counters = cr_stats.setdefault((model, operation), dict.fromkeys(FIGURES, 0))
+    for figure, value in figures.items():
+        counters[figure] += value
+    with _stats_lock:
+        counters = _stats.setdefault(
+            (cr.dbname, model, operation), dict.fromkeys(FIGURES, 0)
+        )
+        for figure, value in figures.items():
+            counters[figure] += value
+    _dump_stats()
+
+
+def _dump_stats():
+    """Log and reset the counters of the server process every
+    `auditlog_stats_interval` seconds (server configuration option, 0 - the
+    default - to never log them).
+    """
+    global _last_dump
+    interval = int(config.get("auditlog_stats_interval") or 0)
+    if not interval or time.monotonic() - _last_dump < interval:
+        return
+    with _stats_lock:
+        if time.monotonic() - _last_dump < interval:
+            # Dumped by another thread in the meantime
+            return
+        stats = sorted(_stats.items())
+        _stats.clear()
+        _last_dump = time.monotonic()
+    for (dbname, model, operation), counters in stats:
+        _logger.info(
+            "%s %s %s: %s",
+            dbname,
+            model,
+            operation,
+            ", ".join("%s=%s" % (figure, counters[figure]) for figure in FIGURES),
+        )
+
+
+def get_stats(dbname):
+    """Return a copy of the counters of the server process for the database
+    `dbname`: {(MODEL, OPERATION): {FIGURE: VALUE}}
+    """
+    with _stats_lock:
+        return {
+            (model, operation): dict(counters)
+            for (db, model, operation), counters in _stats.items()
+            if db == dbname
+        }
+
+
+def reset_stats(dbname):
+    with _stats_lock:
+        for key in [key for key in _stats if key[0] == dbname]:
+            del _stats[key]
+
+
+class Measure(object):
+    """Context manager counting the time and queries spent in its block,
+    except in the blocks of its `pause()` context manager.
+    """
+
+    def __init__(self, cr, model, operation, records=0, calls=1):
+        self.cr = cr
+        self.model = model
+        self.operation = operation
+        self.records = records
+        self.calls = calls
+        self.time = 0
+        self.queries = 0
+
+    def _start(self):
+        self.time -= time.perf_counter()
+        self.queries -= self.cr.sql_log_count
+
+    def _stop(self):
+        self.time += time.perf_counter()
+        self.queries += self.cr.sql_log_count
+
+    def __enter__(self):
+        self._start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop()
+        add(
+            self.cr,
+            self.model,
+            self.operation,
+            calls=self.calls,
+            records=self.records,
+            time=self.time,
+            queries=self.queries,
+        )
+
+    @contextmanager
+    def pause(self):
+        self._stop()
+        try:
+            yield
+        finally:
+            self._start()
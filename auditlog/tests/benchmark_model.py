@@ -0,0 +1,39 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+from odoo import fields, models
+
+# Number of fields of each type of the benchmark model
+FIELDS_PER_TYPE = 10
+
+
+def _benchmark_fields():
+    """Return the fields of a wide model: FIELDS_PER_TYPE fields of each of
+    the usual types.
+    """
+    fields_ = {}
+    for index in range(FIELDS_PER_TYPE):
+        fields_.update(
+            {
+                "char_%s" % index: fields.Char(),
+                "text_%s" % index: fields.Text(),
+                "integer_%s" % index: fields.Integer(),
+                "float_%s" % index: fields.Float(),
+                "boolean_%s" % index: fields.Boolean(),
+                "date_%s" % index: fields.Date(),
+                "partner_%s_id" % index: fields.Many2one("res.partner"),
+            }
+        )
+    fields_["tag_ids"] = fields.Many2many("res.partner.category")
+    return fields_
+
+
+AuditlogBenchmark = type(
+    "AuditlogBenchmark",
+    (models.Model,),
+    dict(
+        _benchmark_fields(),
+        __module__=__name__,
+        _name="auditlog.benchmark",
+        _description="Auditlog - Benchmark model",
+        name=fields.Char(),
+    ),
+)
@@ -2,10 +2,17 @@
 # © 2018 Pieter Paulussen <pieter_paulussen@me.com>
 # © 2021 Stefan Rijnhart <stefan@opener.amsterdam>
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import base64
+import hashlib
+from unittest import mock
+
+from odoo import fields
 from odoo.tests.common import Form, TransactionCase
 
 from odoo.addons.base.models.ir_model import MODULE_UNINSTALL_FLAG
 
+from .. import stats, writer
+
 
 class AuditlogCommon(object):
     def test_LogCreation(self):
@@ -193,6 +200,29 @@ class AuditlogCommon(object):
         if self.groups_rule.capture_record:
             self.assertTrue(len(log_record.line_ids) > 0)
 
+    def test_LogCreation7(self):
+        """Seventh test, update several records at once and check that each
+        record gets its own log, with its own lines.
+        """
+        self.groups_rule.subscribe()
+
+        auditlog_log = self.env["auditlog.log"]
+        groups = self.env["res.groups"].create(
+            [{"name": "testgroup7a"}, {"name": "testgroup7b"}]
+        )
+        groups.write({"comment": "Batched"})
+        logs = auditlog_log.search(
+            [
+                ("model_id", "=", self.groups_model_id),
+                ("method", "=", "write"),
+                ("res_id", "in", groups.ids),
+            ]
+        )
+        self.assertEqual(sorted(logs.mapped("res_id")), sorted(groups.ids))
+        for log in logs:
+            self.assertEqual(log.line_ids.mapped("field_name"), ["comment"])
+            self.assertEqual(log.line_ids.new_value, "Batched")
+
 
 class TestAuditlogFull(TransactionCase, AuditlogCommon):
     def setUp(self):
@@ -214,6 +244,134 @@ class TestAuditlogFull(TransactionCase, AuditlogCommon):
         self.groups_rule.unlink()
         super(TestAuditlogFull, self).tearDown()
 
+    def test_LogCreation_x2many_names(self):
+        """Related records of all the logged records are named in the text
+        values of the log lines.
+        """
+        self.groups_rule.subscribe()
+
+        implied_group = self.env["res.groups"].create({"name": "testimplied"})
+        groups = self.env["res.groups"].create(
+            [{"name": "testgroup8a"}, {"name": "testgroup8b"}]
+        )
+        groups.write({"implied_ids": [(4, implied_group.id)]})
+        lines = self.env["auditlog.log.line"].search(
+            [
+                ("log_id.model_id", "=", self.groups_model_id),
+                ("log_id.method", "=", "write"),
+                ("log_id.res_id", "in", groups.ids),
+                ("field_name", "=", "implied_ids"),
+            ]
+        )
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertIn("testimplied", line.new_value_text)
+
+    def test_stats(self):
+        """The overhead of auditlog is counted on the cursor and by the
+        server process.
+        """
+        self.groups_rule.subscribe()
+        stats.reset_stats(self.env.cr.dbname)
+        self.env.cr.auditlog_stats = {}
+
+        groups = self.env["res.groups"].create(
+            [{"name": "testgroup10a"}, {"name": "testgroup10b"}]
+        )
+        groups.write({"comment": "test"})
+        cr_stats = self.env.cr.auditlog_stats
+        self.assertEqual(cr_stats, stats.get_stats(self.env.cr.dbname))
+        create_stats = cr_stats[("res.groups", "create")]
+        self.assertEqual(create_stats["calls"], 1)
+        self.assertEqual(create_stats["records"], 2)
+        self.assertEqual(create_stats["logs"], 2)
+        self.assertGreater(create_stats["lines"], 2)
+        self.assertGreater(create_stats["queries"], 0)
+        self.assertGreater(create_stats["time"], 0)
+        write_stats = cr_stats[("res.groups", "write")]
+        self.assertEqual(write_stats["calls"], 1)
+        self.assertEqual(write_stats["logs"], 2)
+
+    def test_LogCreation_large_text(self):
+        """Texts larger than the size limit of the rule are logged as a
+        digest, with the diff of the old and new texts.
+        """
+        self.groups_rule.write({"value_size_limit": 20, "log_text_diff": True})
+        self.groups_rule.subscribe()
+
+        old_comment = "first line\nsecond line\n"
+        new_comment = "first line\nthird line\n"
+        group = self.env["res.groups"].create(
+            {"name": "testgroup9", "comment": old_comment}
+        )
+        group.comment = new_comment
+        line = self.env["auditlog.log.line"].search(
+            [
+                ("log_id.model_id", "=", self.groups_model_id),
+                ("log_id.method", "=", "write"),
+                ("log_id.res_id", "=", group.id),
+                ("field_name", "=", "comment"),
+            ]
+        )
+        self.assertEqual(len(line), 1)
+        self.assertEqual(
+            line.old_value,
+            "<text: %s bytes, sha256 %s> %s"
+            % (
+                len(old_comment),
+                hashlib.sha256(old_comment.encode()).hexdigest(),
+                old_comment,
+            ),
+        )
+        self.assertEqual(line.old_value_text, line.old_value)
+        self.assertTrue(line.new_value.startswith("<text: "))
+        self.assertIn("-second line", line.new_value_text)
+        self.assertIn("+third line", line.new_value_text)
+
+    def test_LogCreation_large_text_bytes(self):
+        """The size limit of the rule counts the bytes of the texts"""
+        self.groups_rule.write({"value_size_limit": 20})
+        self.groups_rule.subscribe()
+
+        # 10 characters, 30 bytes
+        comment = "日本語のテキストです"
+        group = self.env["res.groups"].create({"name": "testgroup9"})
+        group.comment = comment
+        line = self.env["auditlog.log.line"].search(
+            [
+                ("log_id.model_id", "=", self.groups_model_id),
+                ("log_id.method", "=", "write"),
+                ("log_id.res_id", "=", group.id),
+                ("field_name", "=", "comment"),
+            ]
+        )
+        self.assertEqual(len(line), 1)
+        self.assertTrue(line.new_value.startswith("<text: 30 bytes, "))
+
+    def test_LogCreation_deprecated_hooks(self):
+        """The former per log line hooks still create the lines of a log"""
+        group = self.env["res.groups"].create({"name": "testgroup10"})
+        log = self.env["auditlog.log"].create(
+            {
+                "name": group.name,
+                "model_id": self.groups_model_id,
+                "res_id": group.id,
+                "method": "write",
+                "user_id": self.env.uid,
+            }
+        )
+        with self.assertWarns(DeprecationWarning):
+            lines = self.env["auditlog.rule"]._create_log_line_on_write(
+                log,
+                ["name", "comment"],
+                {group.id: {"name": "testgroup9", "comment": False}},
+                {group.id: {"name": "testgroup10", "comment": "new"}},
+                ["comment"],
+            )
+        self.assertEqual(lines.mapped("field_name"), ["name"])
+        self.assertEqual(lines.old_value, "testgroup9")
+        self.assertEqual(lines.new_value, "testgroup10")
+
 
 class TestAuditlogFast(TransactionCase, AuditlogCommon):
     def setUp(self):
@@ -235,6 +393,97 @@ class TestAuditlogFast(TransactionCase, AuditlogCommon):
         self.groups_rule.unlink()
         super(TestAuditlogFast, self).tearDown()
 
+    def test_fast_values(self):
+        rule_model = self.env["auditlog.rule"]
+        partner_model = self.env["res.partner"]
+        image = base64.b64encode(b"image")
+        vals = {
+            "name": "testpartner",
+            "image_1920": image,
+            "category_id": [(6, 0, [1, 2])],
+            "child_ids": [(0, 0, {"name": "child", "email": "child@test.com"})],
+            "comment": "not audited",
+        }
+        fast_values = rule_model._get_fast_values(
+            partner_model, vals, {"name", "image_1920", "category_id", "child_ids"}
+        )
+        self.assertEqual(
+            fast_values,
+            {
+                "name": "testpartner",
+                "image_1920": "<binary: %s bytes, sha256 %s>"
+                % (len(image), hashlib.sha256(image).hexdigest()),
+                "category_id": [(6, 0, [1, 2])],
+                "child_ids": [(0, 0, ["email", "name"])],
+            },
+        )
+        # The values themselves are left untouched
+        self.assertEqual(vals["child_ids"][0][2]["name"], "child")
+
+
+class TestAuditlogSmart(TransactionCase, AuditlogCommon):
+    def setUp(self):
+        super(TestAuditlogSmart, self).setUp()
+        self.groups_model_id = self.env.ref("base.model_res_groups").id
+        self.groups_rule = self.env["auditlog.rule"].create(
+            {
+                "name": "testrule for groups",
+                "model_id": self.groups_model_id,
+                "log_read": True,
+                "log_create": True,
+                "log_write": True,
+                "log_unlink": True,
+                "log_type": "smart",
+            }
+        )
+
+    def tearDown(self):
+        self.groups_rule.unlink()
+        super(TestAuditlogSmart, self).tearDown()
+
+    def test_LogCreation_dependent_fields(self):
+        """Only the written fields and the stored computed fields depending
+        on them are logged.
+        """
+        rule_model = self.env["auditlog.rule"]
+        partner_model = self.env["res.partner"]
+        fields_list = rule_model._get_write_fields(
+            partner_model,
+            {"is_company": True},
+            rule_model.get_auditlog_fields(partner_model),
+        )
+        self.assertIn("is_company", fields_list)
+        self.assertIn("commercial_partner_id", fields_list)
+        self.assertNotIn("phone", fields_list)
+
+        self.groups_rule.subscribe()
+        group = self.env["res.groups"].create({"name": "testgroup9"})
+        group.write({"name": "Testgroup9"})
+        log = self.env["auditlog.log"].search(
+            [
+                ("model_id", "=", self.groups_model_id),
+                ("method", "=", "write"),
+                ("res_id", "=", group.id),
+            ]
+        )
+        self.assertEqual(log.log_type, "smart")
+        self.assertIn("name", log.line_ids.mapped("field_name"))
+
+    def test_LogCreation_no_audited_field(self):
+        """Writes which can't change any audited field are not logged"""
+        self.groups_rule.subscribe()
+        group = self.env["res.groups"].create({"name": "testgroup9"})
+        group.write({})
+        self.assertFalse(
+            self.env["auditlog.log"].search(
+                [
+                    ("model_id", "=", self.groups_model_id),
+                    ("method", "=", "write"),
+                    ("res_id", "=", group.id),
+                ]
+            )
+        )
+
 
 class TestFieldRemoval(TransactionCase):
     @classmethod
@@ -547,3 +796,300 @@ class AuditLogRuleTestForUserFields(TransactionCase):
 
         # Removing auditlog_rule
         self.auditlog_rule.unlink()
+
+    def test_07_AuditlogFull_user_exclude_updated(self):
+        # The methods may have been restored by the removal of the rule in
+        # a previous test
+        self.auditlog_rule._patch_methods()
+        self.addCleanup(self.auditlog_rule._revert_methods)
+        domain = [
+            ("model_id", "=", self.auditlog_rule.model_id.id),
+            ("method", "=", "write"),
+            ("res_id", "=", self.testpartner1.id),
+            ("user_id", "=", self.user_2.id),
+        ]
+        partner = self.testpartner1.with_user(self.user_2).with_context(
+            tracking_disable=True
+        )
+        partner.write({"email": "included@mail.com"})
+        self.assertTrue(self.auditlog_log.search(domain))
+        self.auditlog_log.search(domain).unlink()
+        # Excluding a user from an already subscribed rule applies right away
+        self.auditlog_rule.users_to_exclude_ids = [(4, self.user_2.id)]
+        partner.write({"email": "excluded@mail.com"})
+        self.assertFalse(self.auditlog_log.search(domain))
+
+
+class TestAuditlogDeferred(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.groups_model_id = self.env.ref("base.model_res_groups").id
+        self.groups_rule = self.env["auditlog.rule"].create(
+            {
+                "name": "testrule for groups with deferred logs",
+                "model_id": self.groups_model_id,
+                "log_create": True,
+                "log_write": True,
+                "log_unlink": True,
+                "log_type": "full",
+                "logging_mode": "precommit",
+            }
+        )
+        self.groups_rule.subscribe()
+        self.auditlog_log = self.env["auditlog.log"]
+
+    def tearDown(self):
+        self.groups_rule.unlink()
+        super().tearDown()
+
+    def _search_logs(self, group):
+        return self.auditlog_log.search(
+            [("model_id", "=", self.groups_model_id), ("res_id", "=", group.id)]
+        )
+
+    def test_deferred_logs(self):
+        group = self.env["res.groups"].create({"name": "testgroup1"})
+        group.write({"name": "Testgroup1"})
+        self.assertFalse(self._search_logs(group))
+        self.env.cr.precommit.run()
+        logs = self._search_logs(group)
+        self.assertEqual(sorted(logs.mapped("method")), ["create", "write"])
+        write_log = logs.filtered(lambda log: log.method == "write")
+        self.assertIn("name", write_log.line_ids.mapped("field_name"))
+
+    def test_deferred_unlink(self):
+        group = self.env["res.groups"].create({"name": "testgroup2"})
+        group.unlink()
+        self.env.cr.precommit.run()
+        unlink_log = self._search_logs(group).filtered(
+            lambda log: log.method == "unlink"
+        )
+        self.assertEqual(unlink_log.name, "testgroup2")
+
+    def test_async_logs(self):
+        """Logs are handed over to the background writer once the transaction
+        is committed, and written when the server process exits
+        """
+        self.groups_rule.logging_mode = "async"
+        group = self.env["res.groups"].create({"name": "testgroup5"})
+        self.env.cr.precommit.run()
+        self.assertFalse(self._search_logs(group))
+        # The writer writes on its own cursor, the logs of the test
+        # transaction can't be written from there
+        with mock.patch.object(
+            type(self.env["auditlog.rule"]), "_write_deferred_logs", autospec=True
+        ) as mock_write:
+            self.env.cr.postcommit.run()
+            writer.stop_writers()
+        self.assertEqual(mock_write.call_count, 1)
+        entries = mock_write.call_args[0][1]
+        self.assertEqual([entry["res_ids"] for entry in entries], [[group.id]])
+        self.assertEqual(entries[0]["method"], "create")
+
+    def test_async_logs_savepoint(self):
+        """Logs of the operations rolled back by a savepoint are dropped"""
+        self.groups_rule.logging_mode = "async"
+        group = self.env["res.groups"].create({"name": "testgroup6"})
+        with self.assertRaises(ValueError), self.env.cr.savepoint():
+            self.env["res.groups"].create({"name": "testgroup7"})
+            raise ValueError("rollback")
+        self.env.cr.precommit.run()
+        with mock.patch.object(
+            type(self.env["auditlog.rule"]), "_write_deferred_logs", autospec=True
+        ) as mock_write:
+            self.env.cr.postcommit.run()
+            writer.stop_writers()
+        entries = mock_write.call_args[0][1]
+        self.assertEqual([entry["res_ids"] for entry in entries], [[group.id]])
+
+    def test_deferred_buffer_overflow(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "auditlog.deferred_buffer_size", 1
+        )
+        groups = self.env["res.groups"].create(
+            [{"name": "testgroup3"}, {"name": "testgroup4"}]
+        )
+        # The buffer overflowed, logs are written right away
+        logs = self.auditlog_log.search(
+            [("model_id", "=", self.groups_model_id), ("res_id", "in", groups.ids)]
+        )
+        self.assertEqual(len(logs), 2)
+
+
+class TestAuditlogRead(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.groups_model_id = self.env.ref("base.model_res_groups").id
+        self.groups_rule = self.env["auditlog.rule"].create(
+            {
+                "name": "testrule for groups reads",
+                "model_id": self.groups_model_id,
+                "log_read": True,
+                "log_create": False,
+                "log_write": False,
+                "log_unlink": False,
+                "log_type": "full",
+            }
+        )
+        self.groups = self.env["res.groups"].create(
+            [{"name": "testgroup1"}, {"name": "testgroup2"}]
+        )
+        self.auditlog_log = self.env["auditlog.log"]
+
+    def tearDown(self):
+        self.groups_rule.unlink()
+        super().tearDown()
+
+    def _read(self, groups):
+        groups.invalidate_recordset()
+        groups.read(["name", "comment"])
+
+    def _search_logs(self, **domain):
+        return self.auditlog_log.search(
+            [("model_id", "=", self.groups_model_id), ("method", "=", "read")]
+            + [(key, "=", value) for key, value in domain.items()]
+        )
+
+    def test_read_aggregated(self):
+        self.groups_rule.read_mode = "aggregated"
+        self.groups_rule.subscribe()
+        self._read(self.groups[0])
+        self._read(self.groups)
+        self.assertFalse(self._search_logs(res_id=False))
+        self.env.cr.precommit.run()
+        log = self._search_logs(res_id=False)
+        self.assertEqual(len(log), 1)
+        self.assertEqual(log.res_ids, self.groups.ids)
+        self.assertEqual(log.read_field_names, "name,comment")
+        self.assertFalse(log.line_ids)
+
+    def test_read_dedup_window(self):
+        self.groups_rule.read_dedup_window = 3600
+        self.groups_rule.subscribe()
+        self._read(self.groups)
+        self._read(self.groups)
+        for group in self.groups:
+            self.assertEqual(len(self._search_logs(res_id=group.id)), 1)
+
+    def test_read_sample_rate(self):
+        self.groups_rule.read_sample_rate = 2
+        self.groups_rule.subscribe()
+        for __ in range(4):
+            self._read(self.groups[0])
+        self.assertEqual(len(self._search_logs(res_id=self.groups[0].id)), 2)
+
+
+class TestAuditlogCompact(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.groups_model_id = self.env.ref("base.model_res_groups").id
+        self.groups_rule = self.env["auditlog.rule"].create(
+            {
+                "name": "testrule for groups with compact storage",
+                "model_id": self.groups_model_id,
+                "log_create": True,
+                "log_write": True,
+                "log_type": "full",
+                "compact_storage": True,
+            }
+        )
+        self.groups_rule.subscribe()
+
+    def tearDown(self):
+        self.groups_rule.unlink()
+        super().tearDown()
+
+    def test_compact_changes(self):
+        group = self.env["res.groups"].create({"name": "testgroup10"})
+        group.write({"comment": "Compact"})
+        log = self.env["auditlog.log"].search(
+            [
+                ("model_id", "=", self.groups_model_id),
+                ("method", "=", "write"),
+                ("res_id", "=", group.id),
+            ]
+        )
+        self.assertFalse(log.line_ids)
+        self.assertEqual([change["field_name"] for change in log.changes], ["comment"])
+        self.assertEqual(log.changes[0]["old"], None)
+        self.assertEqual(log.changes[0]["new"], "Compact")
+        # Text values identical to the raw ones are not stored twice
+        self.assertNotIn("new_text", log.changes[0])
+        # Changes are shown like log lines
+        line = log.line_view_ids
+        self.assertEqual(line.field_name, "comment")
+        self.assertEqual(line.field_id.name, "comment")
+        self.assertEqual(line.new_value, "Compact")
+        self.assertEqual(line.new_value_text, "Compact")
+
+
+class TestAuditlogHTTP(TransactionCase):
+    def test_is_current(self):
+        http_session = self.env["auditlog.http.session"].create({"name": "sid"})
+        http_request = self.env["auditlog.http.request"].create(
+            {"name": "/web", "http_session_id": http_session.id}
+        )
+        for record in (http_session, http_request):
+            model = self.env[record._name]
+            with self.assertQueryCount(0):
+                self.assertTrue(model._is_current(record.id))
+            self.env.invalidate_all()
+            self.assertTrue(model._is_current(record.id))
+            with self.assertQueryCount(0):
+                self.assertTrue(model._is_current(record.id))
+        http_request.unlink()
+        self.env.invalidate_all()
+        self.assertFalse(self.env["auditlog.http.request"]._is_current(http_request.id))
+
+
+class TestAuditlogSummary(TransactionCase):
+    def test_init(self):
+        """The summary is only created again, empty, when its query changes"""
+        summary_model = self.env["auditlog.log.summary"]
+        summary_model.refresh()
+        summary_model.init()
+        self.assertTrue(summary_model._is_populated())
+        query = summary_model._summary_query()
+        with mock.patch.object(
+            type(summary_model),
+            "_summary_query",
+            autospec=True,
+            return_value="%s " % query,
+        ):
+            summary_model.init()
+        self.assertFalse(summary_model._is_populated())
+        self.assertFalse(summary_model.search([]))
+        self.assertFalse(summary_model.read_group([], ["log_count"], ["model_id"]))
+        summary_model.refresh()
+        self.assertTrue(summary_model._is_populated())
+
+    def test_refresh(self):
+        groups_model_id = self.env.ref("base.model_res_groups").id
+        rule = self.env["auditlog.rule"].create(
+            {
+                "name": "testrule for groups summary",
+                "model_id": groups_model_id,
+                "log_create": True,
+                "log_write": True,
+                "log_type": "full",
+            }
+        )
+        rule.subscribe()
+        groups = self.env["res.groups"].create(
+            [{"name": "testgroup1"}, {"name": "testgroup2"}]
+        )
+        groups.write({"comment": "test"})
+        rule.unlink()
+        summary_model = self.env["auditlog.log.summary"]
+        summary_model.refresh()
+        summary = summary_model.search(
+            [
+                ("model_id", "=", groups_model_id),
+                ("user_id", "=", self.env.uid),
+                ("method", "=", "write"),
+                ("date", "=", fields.Date.today()),
+            ]
+        )
+        self.assertEqual(len(summary), 1)
+        self.assertGreaterEqual(summary.log_count, 2)
+        self.assertGreaterEqual(summary.change_count, 2)
@@ -4,6 +4,8 @@ import time
 
 from odoo.tests.common import TransactionCase
 
+from ..hooks import uninstall_hook
+
 
 class TestAuditlogAutovacuum(TransactionCase):
     def setUp(self):
@@ -42,3 +44,74 @@ class TestAuditlogAutovacuum(TransactionCase):
             [("model_id", "=", self.groups_model_id), ("res_id", "=", group.id)]
         )
         self.assertEqual(nb_logs, 0)
+
+    def test_autovacuum_chunks(self):
+        log_model = self.env["auditlog.log"]
+        groups = self.env["res.groups"].create(
+            [{"name": "testgroup%s" % i} for i in range(3)]
+        )
+        domain = [("model_id", "=", self.groups_model_id), ("res_id", "in", groups.ids)]
+        self.assertGreaterEqual(log_model.search_count(domain), 3)
+        time.sleep(1)
+        self.env["auditlog.autovacuum"].autovacuum(days=0, chunk_size=1)
+        self.assertEqual(log_model.search_count(domain), 0)
+        self.assertFalse(
+            self.env["auditlog.log.line"].search([("log_id.res_id", "in", groups.ids)])
+        )
+
+    def test_autovacuum_partitioned(self):
+        log_model = self.env["auditlog.log"]
+        autovacuum_model = self.env["auditlog.autovacuum"]
+        group = self.env["res.groups"].create({"name": "testgroup1"})
+        # The lines of the current month are kept in the legacy partition,
+        # the monthly partitions start after it
+        with self.assertNoLogs("odoo.addons.auditlog", level="WARNING"):
+            self.assertTrue(autovacuum_model.partition_log_lines())
+        self.assertTrue(autovacuum_model._is_partitioned("auditlog_log_line"))
+        self.assertFalse(autovacuum_model.partition_log_lines())
+        # Lines are still written, and kept, in the partitioned table
+        group.name = "testgroup2"
+        log = log_model.search(
+            [
+                ("model_id", "=", self.groups_model_id),
+                ("res_id", "=", group.id),
+                ("method", "=", "write"),
+            ]
+        )
+        self.assertTrue(log.line_ids)
+        autovacuum_model.autovacuum(days=30)
+        self.assertTrue(log.exists())
+        self.assertTrue(log.line_ids)
+
+    def test_autovacuum_partitioned_update(self):
+        """The partitioned table survives the update of the module"""
+        autovacuum_model = self.env["auditlog.autovacuum"]
+        self.assertTrue(autovacuum_model.partition_log_lines())
+        with self.assertNoLogs(level="ERROR"):
+            self.registry.init_models(
+                self.env.cr,
+                ["auditlog.log.line", "auditlog.log.line.view"],
+                {"module": "auditlog"},
+                install=False,
+            )
+        self.assertTrue(autovacuum_model._is_partitioned("auditlog_log_line"))
+        group = self.env["res.groups"].create({"name": "testgroup1"})
+        group.name = "testgroup2"
+        log = self.env["auditlog.log"].search(
+            [
+                ("model_id", "=", self.groups_model_id),
+                ("res_id", "=", group.id),
+                ("method", "=", "write"),
+            ]
+        )
+        self.assertTrue(log.line_ids)
+
+    def test_autovacuum_partitioned_uninstall(self):
+        autovacuum_model = self.env["auditlog.autovacuum"]
+        self.assertTrue(autovacuum_model.partition_log_lines())
+        uninstall_hook(self.env.cr, self.registry)
+        self.env.cr.execute(
+            "SELECT relname FROM pg_class WHERE relname LIKE %s OR relname = %s",
+            ("auditlog\\_log\\_line%", "auditlog_log_summary"),
+        )
+        self.assertFalse(self.env.cr.fetchall())
@@ -0,0 +1,144 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import itertools
+import logging
+import time
+
+from odoo_test_helper import FakeModelLoader
+
+from odoo.tests.common import TransactionCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZES = (1, 100, 10000)
+# Rule settings benchmarked: (LOG_TYPE, CAPTURE_RECORD), None meaning no rule
+RULE_SETTINGS = (None, ("full", False), ("full", True), ("fast", False))
+OPERATIONS = ("create", "write", "read", "unlink")
+
+
+@tagged("-at_install", "-standard", "post_install", "auditlog_benchmark")
+class TestAuditlogBenchmark(TransactionCase):
+    """Measure the cost of the rule settings on the CRUD operations of a wide
+    model. Not run by default, run it with the test tag 'auditlog_benchmark',
+    e.g.: odoo -d DB -u auditlog --test-tags auditlog_benchmark --stop-after-init
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.loader = FakeModelLoader(cls.env, cls.__module__)
+        cls.loader.backup_registry()
+        from .benchmark_model import AuditlogBenchmark
+
+        cls.loader.update_registry((AuditlogBenchmark,))
+        cls.benchmark_model = cls.env["auditlog.benchmark"]
+        cls.partners = cls.env["res.partner"].create(
+            [{"name": "benchmark partner %s" % index} for index in range(2)]
+        )
+        cls.tag = cls.env["res.partner.category"].create({"name": "benchmark"})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loader.restore_registry()
+        super().tearDownClass()
+
+    def _get_vals(self, index):
+        vals = {"name": "record %s" % index, "tag_ids": [(6, 0, self.tag.ids)]}
+        for field_name, field in self.benchmark_model._fields.items():
+            if field.type == "char" and field_name != "name":
+                vals[field_name] = "value %s" % index
+            elif field.type == "text":
+                vals[field_name] = ("text %s\n" % index) * 10
+            elif field.type in ("integer", "float"):
+                vals[field_name] = index
+            elif field.type == "boolean":
+                vals[field_name] = bool(index % 2)
+            elif field.type == "date":
+                vals[field_name] = "2023-01-01"
+            elif field.type == "many2one":
+                vals[field_name] = self.partners[index % 2].id
+        return vals
+
+    def _count_log_rows(self):
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            SELECT (SELECT count(*) FROM auditlog_log)
+                + (SELECT count(*) FROM auditlog_log_line)
+            """
+        )
+        return self.env.cr.fetchone()[0]
+
+    def _measure(self, operation, records, batch_size):
+        """Run `operation` on a batch of `batch_size` records, return the
+        records of the batch and the figures of the operation: (duration in
+        milliseconds, number of queries, number of audit rows inserted).
+        """
+        rows = self._count_log_rows()
+        queries = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        if operation == "create":
+            records = self.benchmark_model.create(
+                [self._get_vals(index) for index in range(batch_size)]
+            )
+        elif operation == "write":
+            records.write(self._get_vals(batch_size))
+        elif operation == "read":
+            records.invalidate_recordset()
+            records.read()
+        else:
+            records.unlink()
+        self.env.flush_all()
+        duration = (time.perf_counter() - start) * 1000
+        queries = self.env.cr.sql_log_count - queries
+        return records, (duration, queries, self._count_log_rows() - rows)
+
+    def _benchmark(self, settings, batch_size):
+        rule = self.env["auditlog.rule"]
+        if settings:
+            log_type, capture_record = settings
+            rule = rule.create(
+                {
+                    "name": "benchmark rule",
+                    "model_id": self.env["ir.model"]._get("auditlog.benchmark").id,
+                    "log_read": True,
+                    "log_create": True,
+                    "log_write": True,
+                    "log_unlink": True,
+                    "log_type": log_type,
+                    "capture_record": capture_record,
+                }
+            )
+            rule.subscribe()
+        results = {}
+        records = self.benchmark_model
+        for operation in OPERATIONS:
+            records, results[operation] = self._measure(operation, records, batch_size)
+        rule.unlink()
+        return results
+
+    def _get_label(self, settings):
+        if not settings:
+            return "no rule"
+        log_type, capture_record = settings
+        return log_type + (" + capture" if capture_record else "")
+
+    def test_benchmark(self):
+        report = [
+            "%-16s %6s %-7s %12s %12s %10s"
+            % ("rule", "batch", "method", "ms/record", "queries", "audit rows")
+        ]
+        for settings, batch_size in itertools.product(RULE_SETTINGS, BATCH_SIZES):
+            results = self._benchmark(settings, batch_size)
+            for operation, (duration, queries, rows) in results.items():
+                report.append(
+                    "%-16s %6s %-7s %12.3f %12s %10s"
+                    % (
+                        self._get_label(settings),
+                        batch_size,
+                        operation,
+                        duration / batch_size,
+                        queries,
+                        rows,
+                    )
+                )
+        _logger.info("Auditlog benchmark:\n%s", "\n".join(report))
@@ -0,0 +1,114 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import json
+import os
+import socket
+import tempfile
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+from odoo.tools import config
+
+from ..sinks import FileSink, QueueSink, SocketSink, get_sink
+
+
+class TestAuditlogSinks(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.groups_model_id = self.env.ref("base.model_res_groups").id
+        self.groups_rule = self.env["auditlog.rule"].create(
+            {
+                "name": "testrule for groups with a sink",
+                "model_id": self.groups_model_id,
+                "log_create": True,
+                "log_write": True,
+                "log_unlink": True,
+                "log_type": "full",
+                "sink": "file",
+            }
+        )
+        self.groups_rule.subscribe()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "auditlog.jsonl")
+        patcher = patch.dict(config.options, {"auditlog_sink_file": self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.groups_rule.unlink()
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def _read_events(self, path=None):
+        with open(path or self.path) as sink_file:
+            return [json.loads(line) for line in sink_file]
+
+    def test_file_sink(self):
+        group = self.env["res.groups"].create({"name": "testgroup1"})
+        group.name = "testgroup2"
+        self.assertFalse(
+            self.env["auditlog.log"].search(
+                [("model_id", "=", self.groups_model_id), ("res_id", "=", group.id)]
+            )
+        )
+        # Events are sent once the transaction is committed
+        self.assertFalse(os.path.exists(self.path))
+        self.env.cr.precommit.run()
+        self.env.cr.postcommit.run()
+        events = self._read_events()
+        self.assertEqual([event["method"] for event in events], ["create", "write"])
+        self.assertEqual(events[1]["res_id"], group.id)
+        self.assertEqual(events[1]["name"], group.name_get()[0][1])
+        changes = {change["field_name"]: change for change in events[1]["changes"]}
+        self.assertEqual(changes["name"]["old"], "testgroup1")
+        self.assertEqual(changes["name"]["new"], "testgroup2")
+
+    def test_file_sink_savepoint(self):
+        """Events of the operations rolled back by a savepoint are dropped"""
+        group = self.env["res.groups"].create({"name": "testgroup1"})
+        with self.assertRaises(ValueError), self.env.cr.savepoint():
+            self.env["res.groups"].create({"name": "testgroup2"})
+            raise ValueError("rollback")
+        self.env.cr.precommit.run()
+        self.env.cr.postcommit.run()
+        events = self._read_events()
+        self.assertEqual([event["res_id"] for event in events], [group.id])
+
+    def test_file_sink_rotation(self):
+        sink = FileSink(self.path, max_bytes=100, backup_count=2, fsync="always")
+        for index in range(4):
+            sink.send([{"index": index, "data": "x" * 60}])
+        self.assertEqual(self._read_events(), [{"index": 3, "data": "x" * 60}])
+        self.assertEqual(self._read_events(self.path + ".1")[0]["index"], 2)
+        self.assertEqual(self._read_events(self.path + ".2")[0]["index"], 1)
+        self.assertFalse(os.path.exists(self.path + ".3"))
+
+    def test_queue_sink(self):
+        with patch.dict(config.options, {"auditlog_sink_queue_size": 1}):
+            sink = get_sink("queue")
+            self.assertIsInstance(sink, QueueSink)
+            self.assertIs(get_sink("queue"), sink)
+            sink.send([{"index": 1}, {"index": 2}])
+        self.assertEqual(sink.queue.get_nowait(), {"index": 1})
+        self.assertTrue(sink.queue.empty())
+
+    def test_queue_sink_drop_oldest(self):
+        sink = QueueSink(maxsize=2, overflow="drop_oldest")
+        sink.send([{"index": 1}, {"index": 2}, {"index": 3}])
+        self.assertEqual(sink.queue.get_nowait(), {"index": 2})
+        self.assertEqual(sink.queue.get_nowait(), {"index": 3})
+        self.assertTrue(sink.queue.empty())
+
+    def test_file_sink_relative_path(self):
+        with self.assertRaises(ValueError):
+            FileSink("auditlog.jsonl")
+
+    def test_socket_sink(self):
+        path = os.path.join(self.tmp_dir.name, "log.sock")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(server.close)
+        server.bind(path)
+        SocketSink(path).send([{"index": 1}])
+        message = server.recv(1024).decode()
+        # Facility user (1), severity informational (6)
+        self.assertTrue(message.startswith("<14>odoo-auditlog: "))
+        self.assertEqual(json.loads(message.split(": ", 1)[1]), {"index": 1})
@@ -0,0 +1,107 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import atexit
+import contextlib
+import logging
+import queue
+import threading
+
+import odoo
+from odoo import SUPERUSER_ID, api
+
+_logger = logging.getLogger(__name__)
+
+# Number of batches of deferred logs a writer can hold before pushing back
+QUEUE_SIZE = 1000
+# Time (in seconds) given to the writers to write their queued logs when the
+# server process exits
+STOP_TIMEOUT = 30.0
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class AuditlogWriter(threading.Thread):
+    """Background thread writing the deferred logs of a database, on its own
+    connection, once the transactions which produced them are committed.
+    """
+
+    def __init__(self, dbname):
+        super().__init__(name="auditlog.writer.%s" % dbname, daemon=True)
+        self.dbname = dbname
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def push(self, entries):
+        """Queue a batch of deferred logs, without waiting. Returns `False`
+        if the queue is full, in which case the caller has to write the logs
+        by itself.
+        """
+        try:
+            self.queue.put_nowait(entries)
+        except queue.Full:
+            return False
+        return True
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Write the queued logs and stop the writer, waiting for it at
+        most `timeout` seconds.
+        """
+        # End of the queue marker, the writer is reported below if it stays
+        # stuck on a full queue
+        with contextlib.suppress(queue.Full):
+            self.queue.put(None, timeout=timeout)
+        self.join(timeout)
+        if self.is_alive():
+            _logger.error(
+                "Deferred audit logs writer of %s not stopped: %s batches of "
+                "audit log entries lost",
+                self.dbname,
+                self.queue.qsize(),
+            )
+
+    def run(self):
+        threading.current_thread().dbname = self.dbname
+        stopped = False
+        while not stopped:
+            batches = [self.queue.get()]
+            # Write everything already waiting in the same transaction
+            while True:
+                try:
+                    batches.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopped = None in batches
+            entries = [entry for batch in batches if batch for entry in batch]
+            if not entries:
+                continue
+            try:
+                with odoo.registry(self.dbname).cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    env["auditlog.rule"]._write_deferred_logs(entries)
+            except Exception:
+                _logger.exception(
+                    "Unable to write %s deferred audit log entries", len(entries)
+                )
+
+
+def get_writer(dbname):
+    """Return the running writer of the database `dbname`, start it if
+    needed.
+    """
+    with _writers_lock:
+        writer = _writers.get(dbname)
+        if writer is None or not writer.is_alive():
+            writer = _writers[dbname] = AuditlogWriter(dbname)
+            writer.start()
+        return writer
+
+
+@atexit.register
+def stop_writers():
+    """Write the logs queued in the writers before the server process exits,
+    e.g. when a worker is recycled.
+    """
+    with _writers_lock:
+        writers = [writer for writer in _writers.values() if writer.is_alive()]
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
@@ -68,16 +68,31 @@ class Base(models.AbstractModel):
             values[key] = value
 
     @api.model
-    def _jsonify_record(self, parser, rec, root):
-        """JSONify one record (rec). Private function called by jsonify."""
+    def _jsonify_compile(self, parser):
+        """Compile a parser (list of fields) into an execution plan for the
+        records of this model: the list of the fields to export, as dicts
+        with the keys:
+
+            - field: the field of the model
+            - json_key: its key in the JSON dict
+            - function: the function computing its value, if any
+            - resolver: the resolver of its value, if any
+            - plan: the plan of its related records, if it has a subparser
+            - parser, plans: same for reference fields, whose plans are
+              compiled for each model of their values
+
+        Unknown or misconfigured fields are reported once here, instead of
+        for each record.
+        """
         strict = self.env.context.get("jsonify_record_strict", False)
+        plan = []
         for field in parser:
-            field_dict, subparser = rec.__parse_field(field)
+            field_dict, subparser = self.__parse_field(field)
             field_name = field_dict["name"]
-            if field_name not in rec._fields:
+            if field_name not in self._fields:
                 if strict:
                     # let it fail
-                    rec._fields[field_name]  # pylint: disable=pointless-statement
+                    self._fields[field_name]  # pylint: disable=pointless-statement
                 if not tools.config["test_enable"]:
                     # If running live, log proper error
                     # so that techies can track it down
@@ -86,10 +101,86 @@ class Base(models.AbstractModel):
                         {"model": self._name, "fname": field_name},
                     )
                 continue
-            json_key = field_dict.get("target", field_name)
-            field = rec._fields[field_name]
+            field = self._fields[field_name]
+            step = {"field": field, "json_key": field_dict.get("target", field_name)}
             if field_dict.get("function"):
-                function = field_dict["function"]
+                step["function"] = field_dict["function"]
+            elif subparser:
+                if not (field.relational or field.type == "reference"):
+                    if strict:
+                        self._jsonify_bad_parser_error(field_name)
+                    if not tools.config["test_enable"]:
+                        _logger.error(
+                            "%(model)s.%(fname)s not relational",
+                            {"model": self._name, "fname": field_name},
+                        )
+                    continue
+                if field.relational:
+                    comodel = self.env[field.comodel_name]
+                    step["plan"] = comodel._jsonify_compile(subparser)
+                else:
+                    step["parser"] = subparser
+                    step["plans"] = {}
+            else:
+                step["resolver"] = field_dict.get("resolver")
+            plan.append(step)
+        return plan
+
+    @api.model
+    def _jsonify_get_plan(self, step, rec):
+        """Return the plan of the related record `rec` of a plan step."""
+        if "plan" in step:
+            return step["plan"]
+        if rec._name not in step["plans"]:
+            step["plans"][rec._name] = rec._jsonify_compile(step["parser"])
+        return step["plans"][rec._name]
+
+    def _jsonify_prefetch(self, plan):
+        """Load the fields of `plan` for all the records at once, then the
+        fields of their related records, one model and level at a time, so
+        that the serialization of the records reads them from the cache.
+        """
+        if not self:
+            return
+        for step in plan:
+            if "function" in step:
+                # Arbitrary code, whose needs are unknown
+                continue
+            field = step["field"]
+            values = self.mapped(field.name)
+            if field.type == "reference":
+                # Group the referenced records by model
+                records_by_model = {}
+                for value in values:
+                    if value:
+                        records_by_model.setdefault(value._name, []).append(value.id)
+                related = [
+                    self.env[model].browse(ids)
+                    for model, ids in records_by_model.items()
+                ]
+            elif field.relational:
+                related = [values]
+            else:
+                continue
+            for records in related:
+                if "resolver" in step:
+                    # Exported as display names by _jsonify_value
+                    records.mapped("display_name")
+                else:
+                    records._jsonify_prefetch(self._jsonify_get_plan(step, records[:1]))
+
+    @api.model
+    def _jsonify_record_plan(self, plan, rec, root):
+        """JSONify one record (rec) according to a plan compiled by
+        `_jsonify_compile`.
+        """
+        strict = self.env.context.get("jsonify_record_strict", False)
+        for step in plan:
+            field = step["field"]
+            field_name = field.name
+            json_key = step["json_key"]
+            if "function" in step:
+                function = step["function"]
                 try:
                     value = self._function_value(rec, function, field_name)
                 except UserError:
@@ -101,29 +192,26 @@ class Base(models.AbstractModel):
                             {"model": self._name, "func": str(function)},
                         )
                     continue
-            elif subparser:
-                if not (field.relational or field.type == "reference"):
-                    if strict:
-                        self._jsonify_bad_parser_error(field_name)
-                    if not tools.config["test_enable"]:
-                        _logger.error(
-                            "%(model)s.%(fname)s not relational",
-                            {"model": self._name, "fname": field_name},
-                        )
-                    continue
+            elif "resolver" in step:
+                resolver = step["resolver"]
+                value = rec._jsonify_value(field, rec[field.name])
+                value = resolver.resolve(field, rec)[0] if resolver else value
+            else:
                 value = [
-                    self._jsonify_record(subparser, r, {}) for r in rec[field_name]
+                    self._jsonify_record_plan(self._jsonify_get_plan(step, r), r, {})
+                    for r in rec[field_name]
                 ]
                 if field.type in ("many2one", "reference"):
                     value = value[0] if value else None
-            else:
-                resolver = field_dict.get("resolver")
-                value = rec._jsonify_value(field, rec[field.name])
-                value = resolver.resolve(field, rec)[0] if resolver else value
 
             self._add_json_key(root, json_key, value)
         return root
 
+    @api.model
+    def _jsonify_record(self, parser, rec, root):
+        """JSONify one record (rec). Private function called by jsonify."""
+        return self._jsonify_record_plan(rec._jsonify_compile(parser), rec, root)
+
     def jsonify(self, parser, one=False):
         """Convert the record according to the given parser.
 
@@ -162,8 +250,12 @@ class Base(models.AbstractModel):
         for lang in parsers:
             translate = lang or parser.get("language_agnostic")
             records = self.with_context(lang=lang) if translate else self
+            # The parser is compiled once and the values of all the records
+            # loaded beforehand, instead of field by field for each record
+            plan = records._jsonify_compile(parsers[lang])
+            records._jsonify_prefetch(plan)
             for record, json in zip(records, results):
-                self._jsonify_record(parsers[lang], record, json)
+                self._jsonify_record_plan(plan, record, json)
 
         if resolver:
             results = resolver.resolve(results, self)
@@ -182,6 +182,37 @@ class TestParser(TransactionCase):
         expected_json["children"] = []
         self.assertDictEqual(json_partner[0], expected_json)
 
+    def test_json_export_prefetch(self):
+        """The number of queries doesn't depend on the number of records"""
+        parser = [
+            "name",
+            ("country_id", ["code", "name"]),
+            ("category_id", ["name"]),
+            ("child_ids", ["name", "email", ("category_id", ["name"])]),
+            "state_id",
+        ]
+
+        def count_queries(partners):
+            partners.env.invalidate_all()
+            queries = partners.env.cr.sql_log_count
+            partners.jsonify(parser)
+            return partners.env.cr.sql_log_count - queries
+
+        partners = self.partner
+        for index in range(10):
+            partners |= self.partner.copy(
+                {
+                    "name": "Akretion %s" % index,
+                    "child_ids": [(0, 0, {"name": "Child %s" % index})],
+                }
+            )
+        self.env.flush_all()
+        self.assertEqual(count_queries(partners[:2]), count_queries(partners))
+        self.assertEqual(
+            partners.jsonify(parser),
+            [partner.jsonify(parser, one=True) for partner in partners],
+        )
+
     def test_one(self):
         parser = [
             "name",
@@ -0,0 +1,122 @@
+"""Load benchmark of the session store.
+
+Run the get, save, rotate and delete operations of the session store from
+concurrent threads against a PostgreSQL database, and report their
+throughput and latencies along with the counters of the store, e.g.:
+
+    python -m odoo.addons.session_db.benchmark --uri postgres:///sessions
+
+The ``SESSION_DB_*`` environment variables configure the store as they do
+in the server.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from odoo import http
+
+from .pg_session_store import PGSessionStore
+
+OPERATIONS = ("save", "get", "rotate", "delete")
+
+
+def run_session(store, timings):
+    """Run the lifecycle of a session, adding the duration of each operation
+    to `timings`: {OPERATION: [SECONDS]}
+    """
+
+    def timed(operation, *args):
+        start = time.perf_counter()
+        result = getattr(store, operation)(*args)
+        timings[operation].append(time.perf_counter() - start)
+        return result
+
+    session = store.new()
+    session["context"] = {"lang": "en_US", "tz": "Europe/Brussels", "uid": 2}
+    session["debug"] = ""
+    timed("save", session)
+    session = timed("get", session.sid)
+    # An unchanged session, then a changed one
+    timed("save", session)
+    session["debug"] = "1"
+    timed("save", session)
+    session = timed("get", session.sid)
+    timed("rotate", session, None)
+    timed("delete", session)
+
+
+def run_thread(store, iterations, timings):
+    for __ in range(iterations):
+        run_session(store, timings)
+
+
+def benchmark(uri, threads, iterations):
+    """Run `iterations` session lifecycles in each of `threads` threads,
+    return the report of the benchmark.
+    """
+    store = PGSessionStore(uri, session_class=http.Session)
+    stats = store.get_stats()
+    thread_timings = [defaultdict(list) for __ in range(threads)]
+    workers = [
+        threading.Thread(target=run_thread, args=(store, iterations, timings))
+        for timings in thread_timings
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - start
+    report = [
+        "%s threads, %s sessions each, %.2fs" % (threads, iterations, duration),
+        "%-8s %10s %10s %10s %10s" % ("method", "ops", "ops/s", "p50 (ms)", "p99 (ms)"),
+    ]
+    for operation in OPERATIONS:
+        timings = [
+            timing for timings in thread_timings for timing in timings[operation]
+        ]
+        if len(timings) > 1:
+            percentiles = statistics.quantiles(timings, n=100)
+        else:
+            # Quantiles need two timings at least
+            percentiles = timings * 99
+        report.append(
+            "%-8s %10s %10.1f %10.3f %10.3f"
+            % (
+                operation,
+                len(timings),
+                len(timings) / duration,
+                percentiles[49] * 1000,
+                percentiles[98] * 1000,
+            )
+        )
+    for name, value in sorted(store.get_stats().items()):
+        report.append("%s: %s" % (name, round(value - stats.get(name, 0), 3)))
+    return "\n".join(report)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("%r is not a positive integer" % value)
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--uri", required=True, help="connection string of the sessions database"
+    )
+    parser.add_argument("--threads", type=positive_int, default=8)
+    parser.add_argument(
+        "--iterations", type=positive_int, default=100, help="sessions per thread"
+    )
+    args = parser.parse_args()
+    sys.stdout.write(benchmark(args.uri, args.threads, args.iterations) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,22 @@
 # @author Nicolas Seinlet
 # Copyright (c) ACSONE SA 2022
 # @author Stéphane Bidoul
+import copy
+import datetime
+import hashlib
 import json
 import logging
 import os
+import select
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 
 import psycopg2
+from psycopg2 import sql
 
 import odoo
 from odoo import http
@@ -15,28 +26,35 @@ from odoo.tools.func import lazy_property
 
 _logger = logging.getLogger(__name__)
 
-lock = None
-if odoo.evented:
-    import gevent.lock
+# Maximum number of connections of the session store of a server process
+DEFAULT_POOL_SIZE = 4
+# Same for the evented server process, whose greenlets serve many long
+# polling connections at once
+DEFAULT_EVENTED_POOL_SIZE = 16
+# Minimum number of seconds between two updates of the write date of an
+# unchanged session
+DEFAULT_TOUCH_INTERVAL = 300
+# Number of loaded sessions whose payload digest is remembered
+DIGESTS_SIZE = 10000
+# Seconds during which a session is served from the cache of the server
+# process, if the cache is enabled (SESSION_DB_CACHE_SIZE)
+DEFAULT_CACHE_TTL = 60
+# Channel of the notifications of the changes of the sessions
+NOTIFY_CHANNEL = "http_sessions"
+# Seconds to wait before listening again when the listener connection failed
+LISTENER_RETRY_DELAY = 10
+# Number of expired sessions deleted per query by the vacuum
+DEFAULT_VACUUM_BATCH_SIZE = 1000
+# Maximum number of seconds spent by a vacuum
+DEFAULT_VACUUM_TIME_LIMIT = 10
 
-    lock = gevent.lock.RLock()
-elif odoo.tools.config["workers"] == 0:
-    import threading
 
-    lock = threading.RLock()
+def _get_semaphore(size):
+    if odoo.evented:
+        import gevent.lock
 
-
-def with_lock(func):
-    def wrapper(*args, **kwargs):
-        try:
-            if lock is not None:
-                lock.acquire()
-            return func(*args, **kwargs)
-        finally:
-            if lock is not None:
-                lock.release()
-
-    return wrapper
+        return gevent.lock.BoundedSemaphore(size)
+    return threading.BoundedSemaphore(size)
 
 
 def with_cursor(func):
@@ -45,109 +63,532 @@ def with_cursor(func):
         while True:
             tries += 1
             try:
-                self._ensure_connection()
-                return func(self, *args, **kwargs)
+                with self._pool.cursor() as cr:
+                    result = func(self, cr, *args, **kwargs)
             except (psycopg2.InterfaceError, psycopg2.OperationalError):
-                self._close_connection()
                 if tries > 4:
                     _logger.warning(
                         "session_db operation try %s/5 failed, aborting", tries
                     )
+                    self._add_stats(failures=1)
                     raise
                 _logger.info("session_db operation try %s/5 failed, retrying", tries)
+                self._add_stats(retries=1)
+            else:
+                self._add_stats(operations=1)
+                self._log_stats()
+                return result
 
     return wrapper
 
 
-class PGSessionStore(sessions.SessionStore):
-    def __init__(self, uri, session_class=None):
-        super().__init__(session_class)
+class CursorPool:
+    """Bounded pool of autocommit cursors on the sessions database, each
+    operation checking a cursor out for its own use.
+    """
+
+    def __init__(self, uri, size):
         self._uri = uri
-        self._cr = None
-        self._open_connection()
-        self._setup_db()
+        self._semaphore = _get_semaphore(size)
+        self._lock = threading.Lock()
+        self._cursors = []
+        self._stats = Counter()
 
-    def __del__(self):
-        self._close_connection()
+    def _open_cursor(self):
+        cnx = odoo.sql_db.db_connect(self._uri, allow_uri=True)
+        cr = cnx.cursor()
+        cr._cnx.autocommit = True
+        return cr
+
+    def _close_cursor(self, cr):
+        """Return cursor to the pool of Odoo."""
+        try:
+            cr.close()
+        except Exception:  # pylint: disable=except-pass
+            pass
+
+    @contextmanager
+    def cursor(self):
+        """Check a cursor out of the pool, waiting for one if they are all in
+        use. Cursors whose connection failed are closed instead of being put
+        back in the pool.
+        """
+        start = time.perf_counter()
+        with self._semaphore:
+            wait_time = time.perf_counter() - start
+            with self._lock:
+                cr = self._cursors.pop() if self._cursors else None
+                self._stats.update(pool_checkouts=1, pool_wait_time=wait_time)
+                if cr is None:
+                    self._stats.update(pool_connections=1)
+            if cr is None:
+                cr = self._open_cursor()
+            try:
+                yield cr
+            except (psycopg2.InterfaceError, psycopg2.OperationalError):
+                self._close_cursor(cr)
+                raise
+            except Exception:
+                self._put_back(cr)
+                raise
+            else:
+                self._put_back(cr)
 
-    @with_lock
-    def _ensure_connection(self):
-        if self._cr is None:
-            self._open_connection()
+    def _put_back(self, cr):
+        with self._lock:
+            self._cursors.append(cr)
 
-    @with_lock
-    def _open_connection(self):
-        self._close_connection()
-        cnx = odoo.sql_db.db_connect(self._uri, allow_uri=True)
-        self._cr = cnx.cursor()
-        self._cr._cnx.autocommit = True
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        with self._lock:
+            cursors, self._cursors = self._cursors, []
+        for cr in cursors:
+            self._close_cursor(cr)
+
+
+class SessionCache:
+    """LRU cache of the data of at most `size` sessions, each of them being
+    evicted after `ttl` seconds.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # {SID: (DATA, DIGEST, WRITE_DATE, EXPIRATION)}
+        self._entries = OrderedDict()
+
+    def get(self, sid):
+        """Return the cached (data, digest, write_date) of session `sid`, or
+        `None`.
+        """
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+        return entry[:3]
 
-    @with_lock
-    def _close_connection(self):
-        """Return cursor to the pool."""
-        if self._cr is not None:
+    def set(self, sid, data, digest, write_date):
+        with self._lock:
+            self._entries[sid] = (data, digest, write_date, time.monotonic() + self.ttl)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SessionListener(threading.Thread):
+    """Listen to the notifications of the changes of the sessions made by
+    the other server processes, to evict them from the cache of `store`.
+    """
+
+    def __init__(self, store):
+        super().__init__(name="session_db.listener", daemon=True)
+        self._store = store
+
+    def run(self):
+        while True:
             try:
-                self._cr.close()
-            except Exception:  # pylint: disable=except-pass
-                pass
-            self._cr = None
+                self._listen()
+            except Exception:
+                _logger.exception("session_db listener failed, listening again")
+            # Notifications may have been missed in the meantime
+            self._store._cache.clear()
+            time.sleep(LISTENER_RETRY_DELAY)
+
+    def _listen(self):
+        cnx = odoo.sql_db.db_connect(self._store._uri, allow_uri=True)
+        with cnx.cursor() as cr:
+            conn = cr._cnx
+            # The notifications are only received outside of transactions
+            conn.autocommit = True
+            cr.execute(sql.SQL("LISTEN {}").format(sql.Identifier(NOTIFY_CHANNEL)))
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                for notify in conn.notifies:
+                    self._store._on_notification(notify.payload)
+                conn.notifies.clear()
+
+
+class SessionVacuum(threading.Thread):
+    """Delete the expired sessions of `store` every `interval` seconds."""
+
+    def __init__(self, store, interval):
+        super().__init__(name="session_db.vacuum", daemon=True)
+        self._store = store
+        self._interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self._store._vacuum()
+            except Exception:
+                _logger.exception("session_db vacuum failed")
+
+
+class PGSessionStore(sessions.SessionStore):
+    def __init__(
+        self, uri, session_class=None, pool_size=None, cache_size=None, cache_ttl=None
+    ):
+        super().__init__(session_class)
+        self._uri = uri
+        if pool_size is None:
+            pool_size = int(
+                os.environ.get("SESSION_DB_POOL_SIZE")
+                or (DEFAULT_EVENTED_POOL_SIZE if odoo.evented else DEFAULT_POOL_SIZE)
+            )
+        self._pool = CursorPool(uri, pool_size)
+        self._touch_interval = datetime.timedelta(
+            seconds=int(
+                os.environ.get("SESSION_DB_TOUCH_INTERVAL") or DEFAULT_TOUCH_INTERVAL
+            )
+        )
+        # Digests and write dates of the payloads of the sessions as they
+        # are stored, to skip the writes of unchanged sessions:
+        # {SID: (DIGEST, WRITE_DATE)}
+        self._digests = OrderedDict()
+        self._digests_lock = threading.Lock()
+        # Cache of the sessions of the server process, disabled by default
+        if cache_size is None:
+            cache_size = int(os.environ.get("SESSION_DB_CACHE_SIZE") or 0)
+        if cache_ttl is None:
+            cache_ttl = int(os.environ.get("SESSION_DB_CACHE_TTL") or DEFAULT_CACHE_TTL)
+        self._cache = SessionCache(cache_size, cache_ttl) if cache_size else None
+        # Identifier of the store in its notifications, to ignore its own
+        self._token = uuid.uuid4().hex
+        # Expired sessions are deleted by batches, either on requests (as
+        # the other session stores) or every SESSION_DB_VACUUM_INTERVAL
+        # seconds by a thread of each server process
+        self._vacuum_batch_size = int(
+            os.environ.get("SESSION_DB_VACUUM_BATCH_SIZE") or DEFAULT_VACUUM_BATCH_SIZE
+        )
+        self._vacuum_time_limit = int(
+            os.environ.get("SESSION_DB_VACUUM_TIME_LIMIT") or DEFAULT_VACUUM_TIME_LIMIT
+        )
+        self._vacuum_interval = int(os.environ.get("SESSION_DB_VACUUM_INTERVAL") or 0)
+        self._threads_pid = None
+        self._threads_lock = threading.Lock()
+        # Store the payloads compressed, in the compressed_payload column
+        self._compress = os.environ.get("SESSION_DB_COMPRESS", "0") not in ("", "0")
+        # Counters of the server process, see `get_stats()`
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        # Log the counters every SESSION_DB_STATS_INTERVAL seconds, if set
+        self._stats_interval = int(os.environ.get("SESSION_DB_STATS_INTERVAL") or 0)
+        self._next_stats_log = time.monotonic() + self._stats_interval
+        self._setup_db()
+
+    def __del__(self):
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.close()
 
-    @with_lock
     @with_cursor
-    def _setup_db(self):
-        self._cr.execute(
+    def _setup_db(self, cr):
+        cr.execute(
             """
                 CREATE TABLE IF NOT EXISTS http_sessions (
                     sid varchar PRIMARY KEY,
                     write_date timestamp without time zone NOT NULL,
-                    payload text NOT NULL
+                    payload text,
+                    compressed_payload bytea
                 )
             """
         )
+        # Look the catalog up first: altering or indexing the table locks it
+        # and requires to own it
+        cr.execute(
+            """
+                SELECT 1 FROM pg_indexes
+                WHERE schemaname = current_schema()
+                AND indexname = 'http_sessions_write_date_index'
+            """
+        )
+        if not cr.fetchone():
+            cr.execute(
+                """
+                    CREATE INDEX IF NOT EXISTS http_sessions_write_date_index
+                        ON http_sessions (write_date)
+                """
+            )
+        # Tables created by the previous versions of the module
+        cr.execute(
+            """
+                SELECT column_name, is_nullable
+                FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                AND table_name = 'http_sessions'
+                AND column_name IN ('payload', 'compressed_payload')
+            """
+        )
+        columns = dict(cr.fetchall())
+        if "compressed_payload" not in columns or columns.get("payload") == "NO":
+            cr.execute(
+                """
+                    ALTER TABLE http_sessions
+                        ADD COLUMN IF NOT EXISTS compressed_payload bytea,
+                        ALTER COLUMN payload DROP NOT NULL
+                """
+            )
+
+    def _add_stats(self, **figures):
+        with self._stats_lock:
+            self._stats.update(figures)
+
+    def get_stats(self):
+        """Return a copy of the counters of the server process:
+        - operations: number of queries (or groups of queries) done
+        - retries: number of queries retried after a connection error
+        - failures: number of queries which failed after all their retries
+        - pool_checkouts: number of cursors checked out of the pool
+        - pool_wait_time: seconds spent waiting for a cursor of the pool
+        - pool_connections: number of connections opened by the pool
+        - payload_bytes: length of the JSON payloads of the saved sessions
+        - stored_bytes: length of these payloads as they are stored
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(self._pool.get_stats())
+        return stats
+
+    def _log_stats(self):
+        if not self._stats_interval or time.monotonic() < self._next_stats_log:
+            return
+        with self._stats_lock:
+            if time.monotonic() < self._next_stats_log:
+                # Logged by another thread in the meantime
+                return
+            self._next_stats_log = time.monotonic() + self._stats_interval
+        _logger.info(
+            "session_db stats: %s",
+            ", ".join(
+                "%s=%s" % (name, round(value, 3))
+                for name, value in sorted(self.get_stats().items())
+            ),
+        )
+
+    def _get_digest(self, payload):
+        return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+    def _remember(self, sid, digest, write_date):
+        with self._digests_lock:
+            self._digests[sid] = (digest, write_date)
+            self._digests.move_to_end(sid)
+            while len(self._digests) > DIGESTS_SIZE:
+                self._digests.popitem(last=False)
+
+    def _forget(self, sid):
+        with self._digests_lock:
+            self._digests.pop(sid, None)
+
+    def _start_threads(self):
+        """Start the listener of the changes of the sessions and the vacuum
+        thread if they are enabled, once per process (the store may be
+        created before the workers are forked).
+        """
+        if self._threads_pid == os.getpid():
+            return
+        with self._threads_lock:
+            if self._threads_pid != os.getpid():
+                if self._cache is not None:
+                    SessionListener(self).start()
+                if self._vacuum_interval:
+                    SessionVacuum(self, self._vacuum_interval).start()
+                self._threads_pid = os.getpid()
+
+    def _notify(self, cr, sid):
+        """Notify the other server processes that session `sid` changed."""
+        if self._cache is not None:
+            cr.execute(
+                "SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, f"{self._token} {sid}")
+            )
+
+    def _on_notification(self, payload):
+        token, sid = payload.split(" ", 1)
+        if token != self._token:
+            self._cache.pop(sid)
 
-    @with_lock
-    @with_cursor
     def save(self, session):
         payload = json.dumps(dict(session))
-        self._cr.execute(
+        digest = self._get_digest(payload)
+        now = datetime.datetime.utcnow()
+        with self._digests_lock:
+            stored_digest, write_date = self._digests.get(session.sid, (None, None))
+        if stored_digest == digest:
+            # Unchanged session: only keep it from expiring
+            if now - write_date >= self._touch_interval:
+                self._touch(session.sid)
+                self._remember(session.sid, digest, now)
+            return
+        stored_payload, compressed_payload = self._encode(payload)
+        self._save(session.sid, stored_payload, compressed_payload)
+        self._add_stats(
+            payload_bytes=len(payload),
+            stored_bytes=len(stored_payload or compressed_payload),
+        )
+        self._remember(session.sid, digest, now)
+        if self._cache is not None:
+            # Cache a copy of the data, the session may still be modified
+            self._cache.set(session.sid, json.loads(payload), digest, now)
+
+    def _encode(self, payload):
+        """Return the values of the payload columns storing `payload`:
+        (PAYLOAD, COMPRESSED_PAYLOAD)
+        """
+        if self._compress:
+            return None, zlib.compress(payload.encode())
+        return payload, None
+
+    @with_cursor
+    def _save(self, cr, sid, payload, compressed_payload):
+        if compressed_payload is not None:
+            compressed_payload = psycopg2.Binary(compressed_payload)
+        cr.execute(
             """
-                INSERT INTO http_sessions(sid, write_date, payload)
-                    VALUES (%(sid)s, now() at time zone 'UTC', %(payload)s)
+                INSERT INTO http_sessions(
+                    sid, write_date, payload, compressed_payload
+                ) VALUES (
+                    %(sid)s,
+                    now() at time zone 'UTC',
+                    %(payload)s,
+                    %(compressed_payload)s
+                )
                 ON CONFLICT (sid)
                 DO UPDATE SET payload = %(payload)s,
+                              compressed_payload = %(compressed_payload)s,
                               write_date = now() at time zone 'UTC'
             """,
-            dict(sid=session.sid, payload=payload),
+            dict(sid=sid, payload=payload, compressed_payload=compressed_payload),
         )
+        self._notify(cr, sid)
 
-    @with_lock
     @with_cursor
+    def _touch(self, cr, sid):
+        cr.execute(
+            """
+                UPDATE http_sessions
+                SET write_date = now() at time zone 'UTC'
+                WHERE sid = %s
+            """,
+            (sid,),
+        )
+
     def delete(self, session):
-        self._cr.execute("DELETE FROM http_sessions WHERE sid=%s", (session.sid,))
+        self._forget(session.sid)
+        if self._cache is not None:
+            self._cache.pop(session.sid)
+        self._delete(session.sid)
 
-    @with_lock
     @with_cursor
+    def _delete(self, cr, sid):
+        cr.execute("DELETE FROM http_sessions WHERE sid=%s", (sid,))
+        self._notify(cr, sid)
+
     def get(self, sid):
-        self._cr.execute("SELECT payload FROM http_sessions WHERE sid=%s", (sid,))
+        self._start_threads()
+        if self._cache is not None:
+            entry = self._cache.get(sid)
+            if entry is not None:
+                data, digest, write_date = entry
+                with self._digests_lock:
+                    # Keep the write date of the session if it was touched
+                    known = self._digests.get(sid, (None,))[0] == digest
+                if not known:
+                    self._remember(sid, digest, write_date)
+                return self.session_class(copy.deepcopy(data), sid, False)
+        row = self._get(sid)
         try:
-            data = json.loads(self._cr.fetchone()[0])
+            payload, compressed_payload, write_date = row
+            if compressed_payload is not None:
+                payload = zlib.decompress(compressed_payload).decode()
+            data = json.loads(payload)
         except Exception:
             return self.new()
-
+        digest = self._get_digest(payload)
+        if (compressed_payload is not None) != self._compress:
+            # Stored with the other encoding: the next save migrates it
+            digest = None
+        self._remember(sid, digest, write_date)
+        if self._cache is not None:
+            self._cache.set(sid, copy.deepcopy(data), digest, write_date)
         return self.session_class(data, sid, False)
 
+    @with_cursor
+    def _get(self, cr, sid):
+        cr.execute(
+            """
+                SELECT payload, compressed_payload, write_date
+                FROM http_sessions
+                WHERE sid=%s
+            """,
+            (sid,),
+        )
+        return cr.fetchone()
+
     # This method is not part of the Session interface but is called nevertheless,
     # so let's get it from FilesystemSessionStore.
     rotate = http.FilesystemSessionStore.rotate
 
-    @with_lock
+    def vacuum(self, max_lifetime=None):
+        if not self._vacuum_interval:
+            self._vacuum(max_lifetime)
+
+    def _vacuum(self, max_lifetime=None):
+        """Delete the sessions expired since `max_lifetime` seconds by
+        batches, until there is none left or the time limit is reached.
+        Return the number of deleted sessions.
+        """
+        max_lifetime = max_lifetime or http.SESSION_LIFETIME
+        time_limit = time.monotonic() + self._vacuum_time_limit
+        nb_sessions = 0
+        while True:
+            # Each batch checks out its own cursor, not to keep it from the
+            # requests during the whole vacuum
+            deleted = self._delete_expired(max_lifetime, self._vacuum_batch_size)
+            nb_sessions += deleted
+            if deleted < self._vacuum_batch_size:
+                break
+            if time.monotonic() >= time_limit:
+                _logger.info("session_db vacuum time limit reached")
+                break
+        _logger.debug("session_db vacuum: %s sessions deleted", nb_sessions)
+        return nb_sessions
+
     @with_cursor
-    def vacuum(self):
-        self._cr.execute(
-            "DELETE FROM http_sessions "
-            "WHERE now() at time zone 'UTC' - write_date > %s",
-            (f"{http.SESSION_LIFETIME} seconds",),
+    def _delete_expired(self, cr, max_lifetime, batch_size):
+        # Concurrent vacuums of other server processes skip the sessions
+        # being deleted instead of waiting for them
+        cr.execute(
+            """
+                DELETE FROM http_sessions
+                WHERE sid IN (
+                    SELECT sid FROM http_sessions
+                    WHERE write_date < now() at time zone 'UTC' - %s::interval
+                    ORDER BY write_date
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            """,
+            (f"{max_lifetime} seconds", batch_size),
         )
+        return cr.rowcount
 
 
 _original_session_store = http.root.__class__.session_store
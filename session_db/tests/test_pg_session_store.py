@@ -1,13 +1,19 @@
+import datetime
 from unittest import mock
 
 import psycopg2
 
+import odoo
 from odoo import http
 from odoo.sql_db import connection_info_for
 from odoo.tests.common import TransactionCase
 from odoo.tools import config
 
-from odoo.addons.session_db.pg_session_store import PGSessionStore
+from odoo.addons.session_db.pg_session_store import (
+    DEFAULT_EVENTED_POOL_SIZE,
+    PGSessionStore,
+    SessionListener,
+)
 
 
 def _make_postgres_uri(
@@ -46,8 +52,148 @@ class TestPGSessionStore(TransactionCase):
         self.session_store.delete(session)
         assert self.session_store.get(session.sid).get("test") is None
 
+    def test_save_unchanged(self):
+        """Unchanged sessions are not written again"""
+        session = self.session_store.new()
+        session["test"] = "test"
+        self.session_store.save(session)
+        session = self.session_store.get(session.sid)
+        store = self.session_store
+        with mock.patch.object(store, "_save", wraps=store._save) as mock_save:
+            with mock.patch.object(store, "_touch", wraps=store._touch) as mock_touch:
+                self.session_store.save(session)
+                assert mock_save.call_count == 0
+                assert mock_touch.call_count == 0
+                # The write date of unchanged sessions is still updated
+                store._touch_interval = datetime.timedelta(0)
+                self.session_store.save(session)
+                assert mock_save.call_count == 0
+                assert mock_touch.call_count == 1
+                session["test"] = "test2"
+                self.session_store.save(session)
+                assert mock_save.call_count == 1
+        assert self.session_store.get(session.sid)["test"] == "test2"
+        self.session_store.delete(session)
+
+    def test_cache(self):
+        """Cached sessions are read without a query until they are changed
+        by another server process
+        """
+        _, connection_info = connection_info_for(config["db_name"])
+        store = PGSessionStore(
+            _make_postgres_uri(**connection_info),
+            session_class=http.Session,
+            cache_size=10,
+        )
+        session = store.new()
+        session["test"] = "test"
+        with mock.patch.object(SessionListener, "start") as mock_start:
+            store.save(session)
+            with mock.patch.object(store, "_get", wraps=store._get) as mock_get:
+                cached_session = store.get(session.sid)
+                assert cached_session["test"] == "test"
+                assert mock_get.call_count == 0
+                # The cached data is not shared with the sessions
+                cached_session["test"] = "test2"
+                assert store.get(session.sid)["test"] == "test"
+                # Own notifications are ignored
+                store._on_notification(f"{store._token} {session.sid}")
+                store.get(session.sid)
+                assert mock_get.call_count == 0
+                store._on_notification(f"other {session.sid}")
+                assert store.get(session.sid)["test"] == "test"
+                assert mock_get.call_count == 1
+            assert mock_start.call_count == 1
+            store.delete(session)
+            assert store.get(session.sid).get("test") is None
+
+    def test_vacuum(self):
+        """Expired sessions are deleted by batches"""
+        store = self.session_store
+        sessions = [store.new() for __ in range(3)]
+        for session in sessions:
+            session["test"] = "test"
+            store.save(session)
+        with store._pool.cursor() as cr:
+            cr.execute(
+                """
+                    UPDATE http_sessions
+                    SET write_date = write_date - interval '1 year'
+                    WHERE sid IN %s
+                """,
+                (tuple(session.sid for session in sessions[:2]),),
+            )
+        # Vacuumed by a thread instead of on requests
+        store._vacuum_interval = 60
+        store.vacuum()
+        store._vacuum_interval = 0
+        assert store.get(sessions[0].sid).get("test") == "test"
+        store._vacuum_batch_size = 1
+        with mock.patch.object(
+            store, "_delete_expired", wraps=store._delete_expired
+        ) as mock_delete:
+            store.vacuum()
+            assert mock_delete.call_count >= 3
+        assert store.get(sessions[0].sid).get("test") is None
+        assert store.get(sessions[1].sid).get("test") is None
+        assert store.get(sessions[2].sid).get("test") == "test"
+        store.delete(sessions[2])
+
+    def test_compress(self):
+        """Sessions are stored compressed, the ones stored as text are
+        migrated on their next save
+        """
+        store = self.session_store
+        session = store.new()
+        session["test"] = "test" * 100
+        store.save(session)
+        store._compress = True
+        session = store.get(session.sid)
+        assert session["test"] == "test" * 100
+        store.save(session)
+        with store._pool.cursor() as cr:
+            cr.execute(
+                "SELECT payload, compressed_payload FROM http_sessions WHERE sid=%s",
+                (session.sid,),
+            )
+            payload, compressed_payload = cr.fetchone()
+        assert payload is None
+        assert compressed_payload is not None
+        assert store.get(session.sid)["test"] == "test" * 100
+        stats = store.get_stats()
+        assert stats["stored_bytes"] < stats["payload_bytes"]
+        store.delete(session)
+
+    def test_evented(self):
+        """In evented mode, the pooled cursors are waited for cooperatively"""
+        import gevent.lock
+
+        _, connection_info = connection_info_for(config["db_name"])
+        with mock.patch.object(odoo, "evented", True):
+            store = PGSessionStore(
+                _make_postgres_uri(**connection_info), session_class=http.Session
+            )
+        semaphore = store._pool._semaphore
+        assert isinstance(semaphore, gevent.lock.BoundedSemaphore)
+        for __ in range(DEFAULT_EVENTED_POOL_SIZE):
+            assert semaphore.acquire(blocking=False)
+        assert not semaphore.acquire(blocking=False)
+
+    def test_pool(self):
+        """Concurrent operations use their own cursor, which is reused"""
+        pool = self.session_store._pool
+        with pool.cursor() as cr1:
+            with pool.cursor() as cr2:
+                assert cr1 is not cr2
+        with pool.cursor() as cr3:
+            assert cr3 in (cr1, cr2)
+        assert len(pool._cursors) == 2
+
     def test_retry(self):
         """Test that session operations are retried before failing"""
+        stats = self.session_store.get_stats()
+        operations = stats["operations"]
+        checkouts = stats["pool_checkouts"]
         with mock.patch("odoo.sql_db.Cursor.execute") as mock_execute:
             mock_execute.side_effect = psycopg2.OperationalError()
             try:
@@ -59,8 +205,14 @@ class TestPGSessionStore(TransactionCase):
                 # in a way that interferes with the Cursor.execute mock
                 raise AssertionError("expected psycopg2.OperationalError")
             assert mock_execute.call_count == 5
+        stats = self.session_store.get_stats()
+        assert stats["retries"] == 4
+        assert stats["failures"] == 1
         # when the error is resolved, it works again
         self.session_store.get("abc")
+        stats = self.session_store.get_stats()
+        assert stats["operations"] == operations + 1
+        assert stats["pool_checkouts"] == checkouts + 6
 
     def test_retry_connect_fail(self):
         with mock.patch("odoo.sql_db.Cursor.execute") as mock_execute, mock.patch(